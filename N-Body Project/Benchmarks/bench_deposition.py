@@ -0,0 +1,44 @@
+"""
+Compares the old np.histogramdd NGP binning against the bincount based deposition
+engine (NGP, CIC and TSC), for the deposition and the interpolation back.
+Run from this folder with: python bench_deposition.py [gridsize] [npart]
+"""
+import sys
+import numpy as np
+
+from common import best_of
+import deposition as dp
+
+
+def histogram_ngp(posP,mass,size):
+    """
+    The original NBody.density_assignment()
+    """
+    intPos = np.rint(posP).astype('int') % size[0]
+    E = np.linspace(0, size[0]-1, num=size[0]+1)
+    E = np.repeat([E], 2, axis=0)
+    return np.histogramdd(intPos, bins=E,weights=mass.flatten())[0]
+
+
+if __name__ == '__main__':
+    gridsize = int(sys.argv[1]) if len(sys.argv) > 1 else 2**9
+    npart = int(sys.argv[2]) if len(sys.argv) > 2 else 2**17
+    size = (gridsize,gridsize)
+    rng = np.random.default_rng(0)
+    posP = rng.random((npart,2))*(gridsize-1)
+    mass = np.full((npart,1),1/npart)
+    field = rng.standard_normal((2,)+size)
+
+    t_hist,rho_hist = best_of(lambda: histogram_ngp(posP,mass,size))
+    print(f"Grid {gridsize}x{gridsize}, {npart} particles")
+    print(f"{'scheme':>16} {'deposit [ms]':>14} {'interp [ms]':>12}")
+    print(f"{'histogramdd NGP':>16} {1e3*t_hist:>14.2f} {'':>12}")
+    for scheme in dp.SCHEMES:
+        def dep():
+            flat,w = dp.stencil(posP,size,scheme)
+            return flat,w,dp.deposit(flat,w,mass,size)
+        t_dep,(flat,w,rho) = best_of(dep)
+        t_int,_ = best_of(lambda: dp.interpolate(field,flat,w))
+        print(f"{scheme:>16} {1e3*t_dep:>14.2f} {1e3*t_int:>12.2f}")
+        if scheme == 'NGP':
+            assert np.allclose(rho,rho_hist)
@@ -0,0 +1,28 @@
+"""
+Steps of K realizations run as K separate NBody objects against a single
+ensemble.Ensemble holding all of them (one batched FFT and deposition per step).
+Run from this folder with: python bench_ensemble.py [gridsize] [npart] [members]
+"""
+import sys
+
+from common import Particles, best_of
+import NBody as nb
+import ensemble as en
+
+
+if __name__ == '__main__':
+    gridsize = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    npart = int(sys.argv[2]) if len(sys.argv) > 2 else 2**10
+    members = int(sys.argv[3]) if len(sys.argv) > 3 else 32
+    size = (gridsize,gridsize)
+    systems = [Particles(npart,size,seed=k) for k in range(members)]
+    print(f"Grid {gridsize}x{gridsize}, {npart} particles, {members} members, 5 steps")
+    print(f"{'boundary':>12} {'scheme':>6} {'separate [ms]':>14} {'ensemble [ms]':>14}")
+    for boundary_type in ['Periodic','Non-Periodic']:
+        for scheme in ['NGP','CIC']:
+            kw = dict(soft=0.8,boundary_type=boundary_type,scheme=scheme)
+            runs = [nb.NBody(size,s,0.1,**kw) for s in systems]
+            separate,_ = best_of(lambda: [g.evolve(5) for g in runs],repeat=3)
+            E = en.Ensemble(size,systems,0.1,**kw)
+            together,_ = best_of(lambda: E.evolve(5),repeat=3)
+            print(f"{boundary_type:>12} {scheme:>6} {1e3*separate:>14.1f} {1e3*together:>14.1f}")
@@ -0,0 +1,48 @@
+"""
+Times one potential solve (NBody.pot()) per FFT backend and number of threads.
+Run from this folder with: python bench_fft_workers.py [gridsize] [npart]
+"""
+import os
+import sys
+import time
+import numpy as np
+
+import common
+import particle as P
+import NBody as nb
+import fft_backend as fb
+
+
+def step_time(g,repeat=5):
+    """
+    Best time out of repeat of a pot() call (the cached potential is dropped each time)
+    """
+    best = np.inf
+    for i in range(repeat):
+        g.V = None
+        st = time.perf_counter()
+        g.pot()
+        best = min(best,time.perf_counter()-st)
+    return best
+
+
+if __name__ == '__main__':
+    gridsize = int(sys.argv[1]) if len(sys.argv) > 1 else 2**9
+    npart = int(sys.argv[2]) if len(sys.argv) > 2 else 2**14
+    size = (gridsize,gridsize)
+    s = P.system_init(npart,size,[1/npart]*npart,npart_specificVel=0)
+
+    backends = ['numpy']
+    if fb.sfft is not None:
+        backends.append('scipy')
+    if fb.pyfftw is not None:
+        backends.append('pyfftw')
+    workers = [1,2,4,8,os.cpu_count()]
+    workers = sorted(set(w for w in workers if w <= os.cpu_count()))
+
+    print(f"Grid {gridsize}x{gridsize}, {npart} particles")
+    print(f"{'backend':>8} {'workers':>8} {'pot() [ms]':>12}")
+    for name in backends:
+        for w in (workers if name != 'numpy' else [1]):
+            g = nb.NBody(size,s,1,soft=0.8,fft_backend=name,workers=w)
+            print(f"{name:>8} {w:>8} {1e3*step_time(g):>12.2f}")
@@ -0,0 +1,32 @@
+"""
+Central difference against the spectral gradient of NBody.field_mesh(): the time of
+pot()+field_mesh() for both, and the error of the forces against a direct summation
+over the particles with the same softened green function (isolated box).
+Run from this folder with: python bench_gradient.py [gridsize] [npart] [soft]
+"""
+import sys
+import numpy as np
+
+from common import Cluster, best_of, direct
+import NBody as nb
+
+
+if __name__ == '__main__':
+    gridsize = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    npart = int(sys.argv[2]) if len(sys.argv) > 2 else 2**11
+    soft = float(sys.argv[3]) if len(sys.argv) > 3 else 2.
+    size = (gridsize,gridsize)
+    s = Cluster(npart,size,width=gridsize/16)
+    Fd = direct(s.pos,s.masses,soft)
+    print(f"Grid {gridsize}x{gridsize}, {npart} particles, soft = {soft}, Non-Periodic")
+    print(f"{'scheme':>6} {'gradient':>9} {'pot+field [ms]':>15} {'median err':>11} {'90% err':>8}")
+    for scheme in ['CIC','TSC']:
+        for gradient in ['stencil','spectral']:
+            g = nb.NBody(size,s,1,soft=soft,boundary_type='Non-Periodic',scheme=scheme,gradient=gradient)
+            def field():
+                g.V = None
+                return g.field_mesh()
+            best,_ = best_of(field,skip=1)
+            F = g.forces_pctls()
+            err = np.linalg.norm(F-Fd,axis=1)/np.linalg.norm(Fd,axis=1)
+            print(f"{scheme:>6} {gradient:>9} {1e3*best:>15.2f} {np.median(err):>11.3f} {np.percentile(err,90):>8.3f}")
@@ -0,0 +1,26 @@
+"""
+Times full steps of 3-D (and rectangular) particle-mesh runs.
+Run from this folder with: python bench_grid3d.py [npart] [side side side] ...
+e.g. python bench_grid3d.py 1000000 128 128 128 256 256 256 256 256 64
+"""
+import sys
+
+from common import Particles, best_of
+import NBody as nb
+
+
+def run(size,npart,steps=3):
+    s = Particles(npart,size,speed=0.1)
+    g = nb.NBody(size,s,0.5,soft=1.0,scheme='CIC')
+    t,_ = best_of(lambda: g.evolve(nsteps=1),repeat=steps)
+    grids = g.densities.nbytes+g.ffG.nbytes
+    print(f"{'x'.join(map(str,size)):>14} {npart:>10} {1e3*t:>12.1f} {npart/t:>14.3e} {grids/2**20:>12.1f}")
+
+
+if __name__ == '__main__':
+    npart = int(sys.argv[1]) if len(sys.argv) > 1 else 2**20
+    sides = [int(a) for a in sys.argv[2:]] or [128,128,128,256,256,256]
+    sizes = [tuple(sides[i:i+3]) for i in range(0,len(sides),3)]
+    print(f"{'grid':>14} {'npart':>10} {'step [ms]':>12} {'ptcl-steps/s':>14} {'rho+G [MB]':>12}")
+    for size in sizes:
+        run(size,npart)
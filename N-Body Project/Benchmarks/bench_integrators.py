@@ -0,0 +1,32 @@
+"""
+Energy conservation of the integrators of integrators.py against their cost: each
+one is run to the same final time with a few time steps, and the largest relative
+change of the energy is printed with the number of force evaluations it took.
+Run from this folder with: python bench_integrators.py [gridsize] [npart] [tfinal]
+"""
+import sys
+import time
+
+from common import Particles
+import NBody as nb
+
+
+if __name__ == '__main__':
+    gridsize = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    npart = int(sys.argv[2]) if len(sys.argv) > 2 else 2**12
+    tfinal = float(sys.argv[3]) if len(sys.argv) > 3 else 200.
+    size = (gridsize,gridsize)
+    s = Particles(npart,size,speed=0.05)
+    print(f"Grid {gridsize}x{gridsize}, {npart} particles, CIC, up to t = {tfinal}")
+    print(f"{'integrator':>10} {'dt':>6} {'forces':>7} {'max |dE/E|':>11} {'time [s]':>9}")
+    for integrator in ['euler','kdk','yoshida4']:
+        for dt in [8.,4.,2.]:
+            g = nb.NBody(size,s,dt,soft=1.,scheme='CIC',integrator=integrator)
+            E0 = g.totalEnergy()
+            drift = 0.
+            st = time.perf_counter()
+            for i in range(int(round(tfinal/dt))):
+                energy,_ = g.evolve()
+                drift = max(drift,abs(energy/E0-1))
+            elapsed = time.perf_counter()-st
+            print(f"{integrator:>10} {dt:>6} {g.nforces:>7} {drift:>11.2e} {elapsed:>9.2f}")
@@ -0,0 +1,43 @@
+"""
+Wall time per evolve() call when logging the energy and the tracked positions
+synchronously in text files versus through logger.AsyncLogger.
+Run from this folder with: python bench_logging.py [gridsize] [npart] [ntrack]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from common import Particles
+import NBody as nb
+from logger import AsyncLogger
+
+
+def run(g,energy_file,pos_file,ntrack,frames):
+    st = time.perf_counter()
+    for i in range(frames):
+        g.evolve(nsteps=1,file_save=energy_file,file_save_pos=[pos_file,ntrack])
+    return (time.perf_counter()-st)/frames
+
+
+if __name__ == '__main__':
+    gridsize = int(sys.argv[1]) if len(sys.argv) > 1 else 2**7
+    npart = int(sys.argv[2]) if len(sys.argv) > 2 else 2**12
+    ntrack = int(sys.argv[3]) if len(sys.argv) > 3 else 1000
+    frames = 50
+    size = (gridsize,gridsize)
+    s = Particles(npart,size)
+    folder = tempfile.mkdtemp()
+    energy_path,pos_path = os.path.join(folder,'energy.txt'),os.path.join(folder,'pos.txt')
+
+    g = nb.NBody(size,s,0.1,soft=0.8)
+    with open(energy_path,'w') as fe, open(pos_path,'w') as fp:
+        t_sync = run(g,fe,fp,ntrack,frames)
+
+    g = nb.NBody(size,s,0.1,soft=0.8)
+    with AsyncLogger(energy_path) as fe, AsyncLogger(pos_path) as fp:
+        t_async = run(g,fe,fp,ntrack,frames)
+
+    print(f"Grid {gridsize}x{gridsize}, {npart} particles, {ntrack} tracked")
+    print(f"synchronous files : {1e3*t_sync:.2f} ms/frame")
+    print(f"AsyncLogger       : {1e3*t_async:.2f} ms/frame")
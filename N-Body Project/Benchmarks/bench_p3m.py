@@ -0,0 +1,32 @@
+"""
+Accuracy and cost of the P3M mode against the plain mesh on a clustered system:
+the forces are compared with a direct summation over every pair of particles using
+the same softened green function (isolated box, so the direct sum is exact).
+Run from this folder with: python bench_p3m.py [gridsize] [npart] [soft]
+"""
+import sys
+import numpy as np
+
+from common import Cluster, best_of, direct
+import NBody as nb
+
+
+if __name__ == '__main__':
+    gridsize = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    npart = int(sys.argv[2]) if len(sys.argv) > 2 else 2**11
+    soft = float(sys.argv[3]) if len(sys.argv) > 3 else 0.3
+    size = (gridsize,gridsize)
+    s = Cluster(npart,size)
+    Fd = direct(s.pos,s.masses,soft)
+    print(f"Grid {gridsize}x{gridsize}, {npart} clustered particles, soft = {soft}, isolated box")
+    print(f"{'scheme':>6} {'mode':>10} {'median err':>11} {'90% err':>8} {'forces [ms]':>12}")
+    for scheme in ['CIC','TSC']:
+        for p3m,r_split in [(False,1.25),(True,1.25),(True,2.),('cells',1.25)]:
+            g = nb.NBody(size,s,1,soft=soft,boundary_type='Non-Periodic',scheme=scheme,p3m=p3m,r_split=r_split)
+            def forces():
+                g.V, g.F = None, None
+                return g.forces_pctls()
+            best,F = best_of(forces,repeat=3)
+            err = np.linalg.norm(F-Fd,axis=1)/np.linalg.norm(Fd,axis=1)
+            mode = 'PM' if not p3m else f"{'tree' if p3m is True else 'cells'} {r_split}"
+            print(f"{scheme:>6} {mode:>10} {np.median(err):>11.3f} {np.percentile(err,90):>8.3f} {1e3*best:>12.2f}")
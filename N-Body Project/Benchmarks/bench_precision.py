@@ -0,0 +1,36 @@
+"""
+float64 against float32 grids and particles (the dtype option of NBody): the time of a
+step (deposition, FFTs, gradient, interpolation and push) on a few grid sizes, and the
+largest relative change of the energy over a run for both.
+Run from this folder with: python bench_precision.py [npart] [nsteps] [scheme]
+"""
+import sys
+import numpy as np
+
+from common import Particles, best_of
+import NBody as nb
+
+
+if __name__ == '__main__':
+    npart = int(sys.argv[1]) if len(sys.argv) > 1 else 2**16
+    nsteps = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    scheme = sys.argv[3] if len(sys.argv) > 3 else 'CIC'
+    print(f"{npart} particles, {scheme}, kdk, drift over {nsteps} steps")
+    print(f"{'grid':>6} {'boundary':>12} {'dtype':>8} {'step [ms]':>10} {'speedup':>8} {'max |dE/E|':>11}")
+    for gridsize in [128,256,512]:
+        size = (gridsize,gridsize)
+        s = Particles(npart,size,speed=0.05)
+        for boundary_type in ['Periodic','Non-Periodic']:
+            ref = None
+            for dtype in [np.float64,np.float32]:
+                g = nb.NBody(size,s,1.,soft=1.,boundary_type=boundary_type,scheme=scheme,
+                             integrator='kdk',fft_backend='scipy',dtype=dtype)
+                best,_ = best_of(lambda: g.evolve(),skip=1)
+                ref = ref or best
+                E0 = g.totalEnergy()
+                drift = 0.
+                for i in range(nsteps):
+                    energy,_ = g.evolve()
+                    drift = max(drift,abs(energy/E0-1))
+                print(f"{gridsize:>6} {boundary_type:>12} {np.dtype(dtype).name:>8} {1e3*best:>10.2f} "
+                      f"{ref/best:>8.2f} {drift:>11.2e}")
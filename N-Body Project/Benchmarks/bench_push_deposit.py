@@ -0,0 +1,40 @@
+"""
+Times the particle push + deposition of a step: ut.evolve() followed by
+density_assignment() against the fused kernels of kernels.py.
+Run from this folder with: python bench_push_deposit.py [gridsize] [npart]
+"""
+import sys
+import time
+import numpy as np
+
+from common import Particles
+import util as ut
+import NBody as nb
+import kernels as kr
+
+
+if __name__ == '__main__':
+    gridsize = int(sys.argv[1]) if len(sys.argv) > 1 else 2**9
+    npart = int(sys.argv[2]) if len(sys.argv) > 2 else 2**17
+    size = (gridsize,gridsize)
+    s = Particles(npart,size)
+    print(f"Grid {gridsize}x{gridsize}, {npart} particles, numba {'on' if kr.numba else 'off'}")
+    print(f"{'scheme':>6} {'path':>10} {'push+deposit [ms]':>18}")
+    for scheme in ['NGP','CIC']:
+        for jit in [False,True,'parallel']:
+            g = nb.NBody(size,s,0.1,soft=0.8,scheme=scheme,jit=jit)
+            F = g.forces_pctls()
+            best = np.inf
+            for i in range(6):
+                Fi = F.copy()
+                st = time.perf_counter()
+                if jit:
+                    kr.push_deposit(g.posP,g.velocityP,g.mass,Fi,g.dt,g.size,g.scheme,
+                                    g.densities,g.flatPos,g.weights,parallel=jit=='parallel')
+                else:
+                    g.posP,g.velocityP = ut.evolve(g.posP,g.velocityP,g.mass,Fi,g.dt,g.size)
+                    g.density_assignment()
+                #The first call of a compiled kernel includes its compilation
+                if i > 0:
+                    best = min(best,time.perf_counter()-st)
+            print(f"{scheme:>6} {str(jit):>10} {1e3*best:>18.2f}")
@@ -0,0 +1,195 @@
+"""
+Benchmark suite of the NBody engine: the time of density_assignment(), pot(),
+forces_mesh(), forces_pctls(), totalEnergy() and of a full evolve() step over a grid of
+grid sizes and particle counts, Periodic and Non-Periodic. Each phase is reported as a
+throughput (particles per second, particle-steps per second for evolve) and the peak
+memory allocated by a step is measured with tracemalloc.
+The results can be saved as a baseline and later runs compared with it: a phase that
+got slower (or a step that needs more memory) than the tolerance allows makes the
+script exit with an error, so it can guard a CI job. Baselines only make sense on the
+machine they were saved on.
+Run from this folder with, e.g.:
+    python bench_suite.py --quick --save baseline.json
+    python bench_suite.py --quick --compare baseline.json
+    python bench_suite.py --grids 6 10 --npart 10 20 --out results.json
+"""
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+from common import Particles, per_call
+import NBody as nb
+
+PHASES = ['density_assignment','pot','forces_mesh','forces_pctls','totalEnergy','evolve']
+
+
+def phases(g):
+    """
+    One function per phase, each redoing only its own part: the caches of the
+    potential and of the forces are cleared where needed, but the earlier phases are
+    not redone (e.g. forces_mesh() reuses the potential)
+    """
+    def pot():
+        g.V = None
+        return g.pot()
+    def forces_mesh():
+        g.pot()
+        return g.forces_mesh()
+    def forces_pctls():
+        g.pot()
+        g.F = None
+        return g.forces_pctls()
+    def energy():
+        g.pot()
+        return g.totalEnergy()
+    def evolve():
+        return g.evolve()
+    return {'density_assignment':g.density_assignment,'pot':pot,'forces_mesh':forces_mesh,
+            'forces_pctls':forces_pctls,'totalEnergy':energy,'evolve':evolve}
+
+
+def peak_memory(g):
+    """
+    Peak of the memory allocated during one step (bytes)
+    """
+    tracemalloc.start()
+    try:
+        g.evolve()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_case(gridsize,npart,boundary_type,scheme='CIC',repeat=5,seed=0):
+    """
+    Benchmarks every phase of one configuration
+    Output(s):
+        - result (dict): best time (seconds) and throughput of each phase, and the peak
+        memory of a step
+    """
+    size = (gridsize,gridsize)
+    s = Particles(npart,size,seed=seed,speed=0.01)
+    g = nb.NBody(size,s,1.,soft=1.,boundary_type=boundary_type,scheme=scheme)
+    result = {}
+    for name,fun in phases(g).items():
+        best = per_call(fun,repeat=repeat)
+        result[name] = {'seconds':best,'throughput':npart/best}
+    result['peak_memory'] = peak_memory(g)
+    return result
+
+
+def case_key(gridsize,npart,boundary_type):
+    return f'{boundary_type} grid={gridsize} npart={npart}'
+
+
+def compare(results,baseline,tolerance=0.25,memory_tolerance=0.1,floor=5e-5):
+    """
+    Lists the phases slower than the baseline by more than tolerance (relative), and
+    the steps needing more memory than memory_tolerance allows. Differences smaller
+    than floor seconds are timer noise and ignored.
+    Output(s):
+        - failures (list): (case key, message) of each regression
+    """
+    failures = []
+    for key,result in results.items():
+        if key not in baseline:
+            continue
+        base = baseline[key]
+        for name in PHASES:
+            t, t0 = result[name]['seconds'], base[name]['seconds']
+            if t > t0*(1+tolerance) and t-t0 > floor:
+                failures.append((key,f'{key} {name}: {1e3*t:.3f} ms against {1e3*t0:.3f} ms ({t/t0-1:+.0%})'))
+        m, m0 = result['peak_memory'], base['peak_memory']
+        if m > m0*(1+memory_tolerance):
+            failures.append((key,f'{key} peak memory: {m/2**20:.1f} MiB against {m0/2**20:.1f} MiB ({m/m0-1:+.0%})'))
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Scaling benchmarks of NBody with regression thresholds')
+    parser.add_argument('--grids',type=int,nargs=2,metavar=('LO','HI'),
+                        help='log2 of the smallest and largest grid side (6 10)')
+    parser.add_argument('--npart',type=int,nargs=2,metavar=('LO','HI'),
+                        help='log2 of the smallest and largest number of particles (10 20)')
+    parser.add_argument('--stride',type=int,default=2,help='step between the log2 of the particle counts')
+    parser.add_argument('--boundary',choices=['Periodic','Non-Periodic','both'],default='both')
+    parser.add_argument('--scheme',default='CIC')
+    parser.add_argument('--repeat',type=int,default=5)
+    parser.add_argument('--quick',action='store_true',
+                        help='grids 2^6-2^8 and 2^10-2^14 particles, unless given')
+    parser.add_argument('--out',help='JSON file receiving the results')
+    parser.add_argument('--save',help='save the results as a baseline')
+    parser.add_argument('--compare',help='baseline to compare with, regressions fail the run')
+    parser.add_argument('--tolerance',type=float,default=0.25,help='relative slowdown allowed per phase')
+    parser.add_argument('--memory-tolerance',type=float,default=0.1,help='relative growth of the peak memory allowed')
+    parser.add_argument('--retries',type=int,default=2,help='times the cases that regressed are run again before failing')
+    args = parser.parse_args(argv)
+
+    #The quick ranges only replace the defaults, not ranges given explicitly
+    if args.grids is None:
+        args.grids = [6,8] if args.quick else [6,10]
+    if args.npart is None:
+        args.npart = [10,14] if args.quick else [10,20]
+    grids = [2**i for i in range(args.grids[0],args.grids[1]+1)]
+    nparts = [2**i for i in range(args.npart[0],args.npart[1]+1,args.stride)]
+    boundaries = ['Periodic','Non-Periodic'] if args.boundary == 'both' else [args.boundary]
+
+    print(f"{args.scheme}, best of {args.repeat} batches, throughput in particles/s (particle-steps/s for evolve)")
+    print(f"{'boundary':>12} {'grid':>5} {'npart':>8} "+' '.join(f'{p[:12]:>12}' for p in PHASES)+f" {'peak [MiB]':>10}")
+    results = {}
+    cases = {}
+    st = time.perf_counter()
+    for boundary_type in boundaries:
+        for gridsize in grids:
+            for npart in nparts:
+                result = run_case(gridsize,npart,boundary_type,args.scheme,args.repeat)
+                key = case_key(gridsize,npart,boundary_type)
+                results[key] = result
+                cases[key] = (gridsize,npart,boundary_type)
+                print(f"{boundary_type:>12} {gridsize:>5} {npart:>8} "
+                      +' '.join(f"{result[p]['throughput']:>12.3e}" for p in PHASES)
+                      +f" {result['peak_memory']/2**20:>10.1f}",flush=True)
+    print(f"{len(results)} cases in {time.perf_counter()-st:.1f}s")
+
+    report = {'scheme':args.scheme,'repeat':args.repeat,'results':results}
+    for file in (args.out,args.save):
+        if file is not None:
+            with open(file,'w') as f:
+                json.dump(report,f,indent=1)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        missing = [k for k in results if k not in baseline]
+        if missing:
+            print(f"{len(missing)} cases are not in the baseline and were not compared")
+        failures = compare(results,baseline,args.tolerance,args.memory_tolerance)
+        for attempt in range(args.retries):
+            if not failures:
+                break
+            #A slowdown has to show up again to count, a busy machine makes one-off ones
+            again = {}
+            for key in dict.fromkeys(key for key,_ in failures):
+                gridsize,npart,boundary_type = cases[key]
+                result = run_case(gridsize,npart,boundary_type,args.scheme,args.repeat)
+                #Keep the best of the two runs of each phase
+                for name in PHASES:
+                    if results[key][name]['seconds'] < result[name]['seconds']:
+                        result[name] = results[key][name]
+                result['peak_memory'] = min(result['peak_memory'],results[key]['peak_memory'])
+                again[key] = results[key] = result
+            print(f"Running {len(again)} cases again to confirm {len(failures)} regressions")
+            failures = compare(again,baseline,args.tolerance,args.memory_tolerance)
+        if failures:
+            print(f"{len(failures)} regressions against {args.compare}:")
+            for _,line in failures:
+                print('  '+line)
+            return 1
+        print(f"No regression against {args.compare}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
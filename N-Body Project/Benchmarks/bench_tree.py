@@ -0,0 +1,37 @@
+"""
+Crossover between the tree code and the mesh solver for isolated boxes: the time of
+one force evaluation of each (and the error of the tree against the mesh-free direct
+sum while it is affordable) for a range of particle counts, from a uniform spread
+to a tight clump.
+Run from this folder with: python bench_tree.py [gridsize] [theta]
+"""
+import sys
+import numpy as np
+
+from common import Cluster, best_of, direct
+import NBody as nb
+
+
+if __name__ == '__main__':
+    gridsize = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    theta = float(sys.argv[2]) if len(sys.argv) > 2 else 0.5
+    size = (gridsize,gridsize)
+    soft = 0.8
+    print(f"Grid {gridsize}x{gridsize} (FFTs of {2*gridsize}x{2*gridsize}), Non-Periodic, theta = {theta}")
+    print(f"{'npart':>7} {'clump':>6} {'pm [ms]':>9} {'tree [ms]':>10} {'tree err':>9}")
+    for npart in [2,2**4,2**7,2**10,2**13,2**16]:
+        for fraction in [0.,0.9]:
+            s = Cluster(npart,size,fraction=fraction)
+            times = []
+            for solver in ['pm','tree']:
+                g = nb.NBody(size,s,1,soft=soft,boundary_type='Non-Periodic',scheme='CIC',solver=solver,theta=theta)
+                def forces():
+                    g.V, g.F = None, None
+                    return g.forces_pctls()
+                best,F = best_of(forces,repeat=3)
+                times.append(best)
+            err = ''
+            if npart <= 2**12:
+                Fd = direct(s.pos,s.masses,soft)
+                err = f"{np.median(np.linalg.norm(F-Fd,axis=1)/np.linalg.norm(Fd,axis=1)):.1e}"
+            print(f"{npart:>7} {fraction:>6} {1e3*times[0]:>9.2f} {1e3*times[1]:>10.2f} {err:>9}")
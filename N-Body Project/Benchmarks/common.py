@@ -0,0 +1,104 @@
+"""
+Helpers shared by the benchmark scripts of this folder.
+"""
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),'..'))
+
+
+class Particles:
+    def __init__(self,npart,size,seed=0,speed=1.0):
+        """
+        Uniformly distributed particles of equal mass for any number of dimensions,
+        usable in place of a system_init object.
+        Input(s):
+            - npart (int): number of particles
+            - size (tuple): size of the grid
+            - seed (int): seed of the random generator
+            - speed (float): std of the gaussian velocities
+        """
+        rng = np.random.default_rng(seed)
+        self.pos = rng.random((npart,len(size)))*(np.asarray(size)-1)
+        self.velocities = rng.standard_normal((npart,len(size)))*speed
+        self.masses = np.full((npart,1),1/npart)
+
+
+class Cluster:
+    def __init__(self,npart,size,fraction=0.5,width=3.,seed=0):
+        """
+        Clustered particles of unit mass at rest: a fraction of them in a gaussian clump
+        at the centre of the box, the rest spread uniformly over the middle half of it
+        Input(s):
+            - npart (int): number of particles
+            - size (tuple): size of the grid
+            - fraction (float): fraction of the particles in the clump
+            - width (float): std of the clump (in cells)
+            - seed (int): seed of the random generator
+        """
+        rng = np.random.default_rng(seed)
+        centre = np.asarray(size)/2
+        nclump = int(round(fraction*npart))
+        clump = rng.normal(centre,width,(nclump,len(size)))
+        field = centre+(rng.random((npart-nclump,len(size)))-0.5)*np.asarray(size)/2
+        self.pos = np.concatenate([clump,field])
+        self.velocities = np.zeros_like(self.pos)
+        self.masses = np.ones((npart,1))
+
+
+def direct(posP,mass,soft):
+    """
+    O(N**2) forces with the green function of NBody.green()
+    """
+    F = np.zeros_like(posP)
+    for i in range(len(posP)):
+        d = posP[i]-posP
+        r2 = np.sum(d**2,axis=1)
+        R = np.sqrt(np.maximum(r2,soft**2)+soft**2)
+        dR = np.where(r2>soft**2,np.sqrt(r2)/R,0.)
+        with np.errstate(divide='ignore',invalid='ignore'):
+            f = np.where(r2>0,-dR/(4*np.pi*R**2*np.sqrt(r2)),0.)
+        F[i] = mass[i,0]*np.sum(f[:,None]*mass*d,axis=0)
+    return F
+
+
+def best_of(fun,repeat=5,skip=0):
+    """
+    Best wall time out of repeat calls of fun, ignoring the first skip calls
+    (e.g. the compilation of numba kernels). Returns the time and the last output
+    """
+    best = np.inf
+    for i in range(repeat+skip):
+        st = time.perf_counter()
+        out = fun()
+        if i >= skip:
+            best = min(best,time.perf_counter()-st)
+    return best,out
+
+
+def per_call(fun,repeat=5,min_time=0.02):
+    """
+    Best time of one call of fun for functions too fast to time one call at a time:
+    fun is called enough times in a row to take at least min_time, and the best of 
+    repeat such batches is divided by that count (like timeit's autorange). The first
+    call is a warm up and is not timed
+    """
+    fun()
+    number = 1
+    while True:
+        st = time.perf_counter()
+        for i in range(number):
+            fun()
+        elapsed = time.perf_counter()-st
+        if elapsed >= min_time:
+            break
+        number *= 2 if elapsed <= 0 else max(2,min(10,int(min_time/elapsed)+1))
+    best = elapsed
+    for i in range(repeat-1):
+        st = time.perf_counter()
+        for j in range(number):
+            fun()
+        best = min(best,time.perf_counter()-st)
+    return best/number
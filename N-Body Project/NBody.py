@@ -1,87 +1,270 @@
 import util as ut
+import fft_backend as fb
+import deposition as dp
+import kernels as kr
+import integrators as it
+import p3m as pm
+import treecode as tc
+import initial_conditions as ic
+import slab as sl
+import checkpoint as ck
+import profiler as pr
 import numpy as np
 
 
 class NBody: 
-    def __init__(self,size,particleList,dt,soft=0.1,G=1,boundary_type='Periodic'):
+    def __init__(self,size,particleList,dt,soft=0.1,G=1,boundary_type='Periodic',fft_backend='numpy',workers=1,scheme='NGP',jit=False,integrator='euler',courant=None,p3m=False,r_split=1.25,solver='pm',theta=0.5,gradient='stencil',ffG=None,slabs=None,dtype=np.float64):
         """
         The NBody class that specifies the simulation. 
         Input(s):
-            - size (x,y): size of the grid 
+            - size (tuple): size of the grid, e.g. (x,y) or (x,y,z). Any number of 
+            dimensions works and the sides do not need to be equal
             - particleList (system_init object): Initial list of the particles along with velocity and position
             - dt (float): step in time taken in the simulation 
             - soft (float): softner used for the green function (default 0.1)
             - G (float): Gravitational constant (default 1.0)
             - boundary type: Either set to Periodic or Non-Periodic
+            - fft_backend (str): library doing the FFTs of pot(), one of numpy, scipy, 
+            pyfftw or auto (see fft_backend.py)
+            - workers (int): number of threads used by each FFT (-1 uses all the cores)
+            - scheme (str): mass assignment scheme, NGP, CIC or TSC (see deposition.py)
+            - jit (bool or str): if True, each step pushes and deposits the particles in one 
+            fused pass (compiled with numba when it is installed, see kernels.py). 
+            'parallel' uses the multi-threaded version of that kernel
+            - integrator (str): time integration scheme, euler (the original one), kdk
+            (leapfrog) or yoshida4 (see integrators.py)
+            - courant (float): if given, each step is shortened so that no particle moves
+            by more than that fraction of a cell (dt is then the longest step allowed)
+            - p3m (bool): particle-particle/particle-mesh mode. The mesh only solves the 
+            long-range part of the green function and the pairs closer than a few r_split 
+            add the short-range forces directly (see p3m.py), so soft can be much smaller 
+            than a cell. p3m='cells' finds the pairs with a cell-linked list instead of 
+            scipy's cKDTree
+            - r_split (float): scale (in cells) where the forces go from the pairs to the mesh
+            - solver (str): pm (the mesh) or tree, a Barnes-Hut tree code (see treecode.py)
+            that is much cheaper for few or very clustered particles. Non-Periodic only
+            - theta (float): opening angle of the tree code
+            - gradient (str): how field_mesh() differentiates the potential, stencil (central 
+            difference on the grid) or spectral (i*k times the spectrum of the potential, 
+            one inverse FFT per axis)
+            - ffG (array): precomputed spectrum of the green function (kernel_spectrum() of 
+            another run with the same grid, softener and boundary type), e.g. shared between 
+            the runs of a sweep. It is used as is (read only) instead of being computed
+            - slabs (int): if given, the deposition and the FFTs of pot() are split over 
+            that many worker processes, each owning a slab of rows of the grid (see slab.py)
+            - dtype: float type of the particles and of the grids, float64 or float32 
+            (single precision FFTs on complex64 spectra, half the memory traffic). The 
+            deposition and the energy are still summed in float64. The slabs always 
+            work in float64
         """
+        if integrator not in it.INTEGRATORS:
+            raise ValueError(f'Unknown integrator {integrator}, use one of {list(it.INTEGRATORS)}')
+        if solver not in ('pm','tree'):
+            raise ValueError(f'Unknown solver {solver}, use pm or tree')
+        if solver == 'tree' and (boundary_type != 'Non-Periodic' or p3m):
+            raise ValueError('The tree solver only works for Non-Periodic boxes, without p3m')
+        if gradient not in ('stencil','spectral'):
+            raise ValueError(f'Unknown gradient {gradient}, use stencil or spectral')
+        if slabs and (jit or gradient != 'stencil' or solver != 'pm'):
+            raise ValueError('The slab decomposition only works with the mesh solver, without jit or the spectral gradient')
+        if np.dtype(dtype) not in (np.float32,np.float64):
+            raise ValueError(f'Unknown dtype {dtype}, use float64 or float32')
 
         self.boundary_type = boundary_type
 
-        #If the boundary type is non-periodic, we multiply the grid by 2 in order to make
-        #the particles not feel any from the other side. Everything will only be generated 
-        #in the orignal quadrant (all the particles live in the original (size[0],size[1]))
-        if self.boundary_type == 'Non-Periodic':
-            self.size = (2*size[0],2*size[1])   
+        #If the boundary type is non-periodic, the convolution of pot() is done on a grid
+        #twice as big in order to make the particles not feel any from the other side. 
+        #Only the FFTs see that padded grid: the particles, densities and forces all live 
+        #in the orignal quadrant (size[0],size[1]). Unlike the old doubled grid, the mass
+        #a stencil puts beyond the last gridpoint is lost (see deposition._axis_stencil)
+        self.size = tuple(size)
+        self.ndim = len(self.size)
+        self.periodic = self.boundary_type != 'Non-Periodic'
+        if self.periodic:
+            self.fft_shape = self.size
         else:
-            self.size = size
+            self.fft_shape = tuple(2*n for n in self.size)
         self.soft = soft
         self.G = G
         self.dt = dt
-        self.posP = particleList.pos
-        self.velocityP = particleList.velocities
-        self.mass = particleList.masses
-        x, y = np.arange(self.size[0],dtype=float), np.arange(self.size[0],dtype=float)
-        self.mesh = np.array(np.meshgrid(x,y))
+        self.fft_backend = fft_backend
+        self.workers = workers
+        self.scheme = scheme
+        self.jit = jit
+        self.integrator = integrator
+        self.courant = courant
+        self.p3m = p3m
+        self.r_split = r_split
+        self.solver = solver
+        self.theta = theta
+        self.gradient = gradient
+        self.dtype = np.dtype(dtype)
+        self.cdtype = np.result_type(self.dtype,np.complex64)
+        #Copies, since the fused step updates them in place
+        self.posP = np.array(particleList.pos,dtype=self.dtype)
+        self.velocityP = np.array(particleList.velocities,dtype=self.dtype)
+        self.mass = np.asarray(particleList.masses,dtype=self.dtype)
+        #Random generator of the initial conditions, saved in the checkpoints
+        self.rng = getattr(particleList,'rng',None)
+        self.step = 0
+        self.time = 0.
+        self.nforces = 0
+        self.energy_log = []
+        self.profiler = None
+        #Set by diagnostics.Diagnostics to get the density spectrum of pot()
+        self._ffD_sink = None
+        self.slab = None
+        if slabs:
+            self.slab = sl.SlabPM(self.size,self.fft_shape,slabs,scheme,self.periodic,len(self.posP))
         self.density_assignment()
 
-        self.green()
+        #The spectrum of the green function never changes during a run, so it is
+        #computed once here and reused by every call to pot(). The tree code only 
+        #needs it if pot() is called
+        self._kernel_key = None
+        self._given_ffG = ffG
+        if ffG is not None:
+            cshape = self.fft_shape[:-1]+(self.fft_shape[-1]//2+1,)
+            if ffG.shape != cshape:
+                raise ValueError(f'The green function spectrum has shape {ffG.shape}, expected {cshape}')
+            self._given_key = self._spectrum_key()
+        if self.solver == 'pm':
+            self.kernel_spectrum()
         
+    @classmethod
+    def from_checkpoint(cls,file,**kwargs):
+        """
+        Restarts a run from a checkpoint written by checkpoint.CheckpointWriter. The 
+        spectrum of the green function is taken from the checkpoint when it was saved 
+        there, instead of being computed again.
+        Input(s):
+            - file (str): path of the checkpoint
+            - kwargs: arguments of the constructor overriding the saved ones (e.g. 
+            workers or fft_backend on another machine)
+        Output(s):
+            - g (NBody): the simulation at the step it was saved
+        """
+        data = ck.load(file)
+        params = dict(data['params'],**kwargs)
+        size = params.pop('size')
+        dt = params.pop('dt')
+        params.setdefault('ffG',data.get('ffG'))
+        g = cls(size,ck.State(data),dt,**params)
+        g.step = data['step']
+        g.time = data['time']
+        g.nforces = data['nforces']
+        return g
+
        
+    def profile(self,enable=True,memory=False):
+        """
+        Starts (or stops) timing each phase of the steps: deposition, FFTs, potential, 
+        gradient, interpolation, push... (see profiler.py). Nothing is timed unless this 
+        is called, so the steps cost the same as before. The results accumulate over the 
+        steps in self.stats, and self.profiler.dump(file) writes them to a JSON file.
+        Input(s):
+            - enable (bool): False removes the timers (the stats collected are kept)
+            - memory (bool): also count the bytes allocated by each phase (slower)
+        Output(s):
+            - profiler (Profiler): the profiler attached to the simulation
+        """
+        if self.profiler is not None:
+            self.profiler.detach()
+        if enable:
+            stats = self.profiler.stats if self.profiler is not None else {}
+            self.profiler = pr.Profiler(memory=memory)
+            self.profiler.stats = stats
+            self.profiler.attach(self)
+        return self.profiler
+
+    @property
+    def stats(self):
+        """
+        Time spent in each phase so far (empty if profile() was never called), see 
+        profiler.Profiler.as_dict()
+        """
+        return self.profiler.as_dict() if self.profiler is not None else {}
+
     def density_assignment(self):
         """
-        Function that assigns the density of the grid according to the 
-        Nearest Grid Points (NGP) scheme. A trial with the CIC model (cloud-in-cell)
-        scheme lead to a lot of problems with the inverse scheme, so I opted for the NGP
-        This scheme is just done by assigning the mass of any particle to its nearest 
-        gridpoint (since the cells are of unit length, no need to divide by anything)
+        Function that assigns the density of the grid according to the chosen scheme.
+        For NGP (Nearest Grid Points), the mass of any particle is assigned to its nearest 
+        gridpoint (since the cells are of unit length, no need to divide by anything).
+        CIC (cloud-in-cell) and TSC (triangular-shaped-cloud) spread it over the 2 and 3 
+        closest gridpoints along each axis. The stencil is kept so forces_pctls() can 
+        interpolate back with the exact same weights.
+        With slabs, the densities are deposited by the workers of the slabs.
         """
-       #Assigns to nearest grid point
-        self.intPos = np.rint(self.posP).astype('int') % self.size[0]
-        
-        #To make it easier to access the gridpoints later on 
-        self.mesh_modified = tuple(self.intPos[:, i] for i in range(2))
-
-        #Instead of looping (to save time), I found this method online to bin the masses 
-        #in their nearest gridpoint
-        E = np.linspace(0, self.size[0]-1, num=self.size[0]+1)
-        E = np.repeat([E], 2, axis=0)
-        hist = np.histogramdd(self.intPos, bins=E,weights=self.mass.flatten())
-        
-        self.densities = hist[0]
+        self.flatPos, self.weights = dp.stencil(self.posP,self.size,self.scheme,periodic=self.periodic)
+        if self.slab is not None:
+            self.densities = self.slab.deposit(self.posP,self.mass)
+        else:
+            self.densities = dp.deposit(self.flatPos,self.weights,self.mass,self.size,dtype=self.dtype)
+
+        #The densities changed, so the potential of the last force solve is outdated
+        self.V = None
+        self.F = None
+        self.Upp = None
         
     def green(self):
         """
         Function that defines the greenfunction. 
-        Note: this will only work for square grids as there was not enough time 
-        to implement this with rectangular grids. 
+        To get periodicity, the coordinate along each axis is flipped around the middle
+        of the grid, i.e. gridpoint j is at a distance of j if j < N//2 and N-1-j otherwise.
+        This is done with one open grid per axis (np.ogrid style), so the full mesh of 
+        coordinates never needs to be stored, which matters for 3-D grids.
+        For Non-Periodic, it is built on the padded grid (see fft_shape).
+        With p3m, only the long-range part erf(r/(2*r_split)) of it is kept.
         """
-        r = np.sum(self.mesh**2,axis=0)
+        r = np.zeros(self.fft_shape)
+        for i,n in enumerate(self.fft_shape):
+            x = np.arange(n,dtype=float)
+            x[n//2:] = n-1-x[n//2:]
+            r += (x**2).reshape([-1 if j == i else 1 for j in range(self.ndim)])
+        split = pm.long_range(np.sqrt(r),self.r_split) if self.p3m else 1.
         r[r<self.soft**2] = self.soft**2
         r += self.soft**2
         r = np.sqrt(r)
         
-        g = 1/(4*np.pi*r)
-        
-        #To get periodicity, we flip the corners to get the same behavior around
-        h_x,h_y = self.size[0]//2, self.size[1]//2
-
-        try:
-            g[h_x:, :h_y] = np.flip(g[:h_x,:h_y],axis=0)
-            g[:,h_y:] = np.flip(g[:,:h_y],axis=1)
-        except: 
-            g[h_x:, :h_y+1] = np.flip(g[:h_x+1,:h_y+1],axis=0)
-            g[:,h_y:] = np.flip(g[:,:h_y+1],axis=1)
-        self.g = g
+        self.g = split/(4*np.pi*r)
+
+    def _spectrum_key(self):
+        return (self.soft,self.size,self.boundary_type,self.fft_backend,self.workers,
+                bool(self.p3m),self.r_split,self.dtype)
+
+    def kernel_spectrum(self):
+        """
+        Returns the Fourier transform of the green function. Since the green function 
+        only depends on the softener, the size of the grid and the boundary type, it is 
+        only rebuilt when one of those (or the FFT backend or the p3m split) changed since 
+        the last call. A spectrum given to the constructor is used as long as none of 
+        them changed.
+        """
+        key = self._spectrum_key()
+        if self._kernel_key != key:
+            self.fft = fb.get_backend(self.fft_backend,self.fft_shape,workers=self.workers,dtype=self.dtype)
+            if self._given_ffG is not None and key == self._given_key:
+                self.ffG = self._given_ffG.astype(self.cdtype,copy=False)
+            else:
+                self.green()
+                #Copy since some backends hand back their internal buffer
+                self.ffG = self.fft.rfftn(self.g.astype(self.dtype,copy=False)).astype(self.cdtype)
+            self._kernel_key = key
+            if self.slab is not None:
+                self.slab.set_kernel(self.ffG)
+
+            #Factors of the spectral version of pot() and field_mesh(), one open array
+            #per axis: (1+exp(-ik))/2 is the shift and average of the potential and ik
+            #its derivative (without the Nyquist mode, which has no sign for a real field)
+            k = ic.wavenumbers(self.fft_shape)
+            self._shift = [(0.5*(1+np.exp(-1j*ki))).astype(self.cdtype) for ki in k]
+            self._ik = []
+            for i,ki in enumerate(k):
+                ik = 1j*ki
+                if self.fft_shape[i] % 2 == 0:
+                    ik.flat[self.fft_shape[i]//2] = 0
+                self._ik.append(ik.astype(self.cdtype))
+        return self.ffG
                     
     def pot(self):
         """
@@ -90,84 +273,232 @@ class NBody:
         Made sure to take of the descrepancy between the fft and the center of the particles
         Without the for loops (with the np.roll), the particles were all attracted to themselves
         and started to drift towards the origin.
+        The potential is kept in self.V until the densities change, so calling this 
+        again (e.g. in totalEnergy()) does not redo the FFTs. Do not modify it in place.
+        For Non-Periodic, the densities are zero-padded to fft_shape by the FFT and the 
+        potential is cropped back to the original quadrant.
+        self.Vext holds the same potential with one extra gridpoint on each side (the 
+        periodic image, or the potential just outside the box) for the gradient.
+        The grid axes are the last ones, so the densities can have leading batch axes
+        (see ensemble.py).
         """
-        
-        ffD = np.fft.rfftn(self.densities)
-        ffG = np.fft.rfftn(self.g)
-        ffV = ffD*ffG
-        
-        V = np.fft.irfftn(ffV)
+        if self.V is not None:
+            return self.V
+
+        ffG = self.kernel_spectrum()
+        if self.slab is not None:
+            #The workers do the convolution along with the shift and average below
+            V = self.slab.potential()
+        else:
+            ffD = self.fft.rfftn(self.densities)
+            if self._ffD_sink is not None:
+                self._ffD_sink(ffD)
+            ffV = np.multiply(ffD,ffG,out=ffD)
+
+            if self.gradient == 'spectral':
+                #Same shift and average as below, but on the spectrum. It is kept for the 
+                #gradient of field_mesh() (copied, since irfftn can destroy its input)
+                for s in self._shift:
+                    ffV *= s
+                self.ffV = ffV.copy()
+                V = self.fft.irfftn(ffV)
+            else:
+                V = self.fft.irfftn(ffV)
 
-        #Need to shift and average the potential to center it back to particle
-        for i in range(2):
-            V = 0.5*(np.roll(V,1,axis=i)+V)
+                #Need to shift and average the potential to center it back to particle
+                for i in range(self.ndim):
+                    V = 0.5*(np.roll(V,1,axis=i-self.ndim)+V)
         
-        #If the boundary conditions is not periodic, set the potential to 0
-        if self.boundary_type == 'Non-Periodic':
-            V[0:,0] = 0
-            V[0,-1] = 0
-            V[-1:,-1] = 0
-            V[-1:,0] = 0 
-        return V 
+        lead = V.ndim-self.ndim
+        if self.periodic:
+            self.Vext = np.pad(V,[(0,0)]*lead+[(1,1)]*self.ndim,mode='wrap')
+        else:
+            #Index -1 is the last gridpoint of the padded grid, i.e. just before the box
+            self.Vext = V[(Ellipsis,)+np.ix_(*[np.arange(-1,n+1) for n in self.size])]
+        self.V = self.Vext[(Ellipsis,)+(slice(1,-1),)*self.ndim]
+        return self.V
     
+    def field_mesh(self):
+        """
+        Gravitational field (force per unit mass) on the grid. To take the gradient 
+        of the potential, we use the central difference, or i*k times its spectrum
+        with gradient='spectral' (exact for every mode the grid holds)
+        """
+        self.pot()
+        if self.gradient == 'spectral':
+            fmesh = np.empty((self.ndim,)+self.densities.shape,dtype=self.dtype)
+            crop = (Ellipsis,)+tuple(slice(0,n) for n in self.size)
+            for i,ik in enumerate(self._ik):
+                fmesh[i] = self.fft.irfftn(self.ffV*ik)[crop]
+            return fmesh*self.G
+        fmesh = np.zeros((self.ndim,)+self.densities.shape,dtype=self.dtype)
+        for i in range(self.ndim):
+            lo = [slice(1,-1)]*self.ndim
+            hi = [slice(1,-1)]*self.ndim
+            lo[i], hi[i] = slice(None,-2), slice(2,None)
+            fmesh[i] = 0.5*(self.Vext[(Ellipsis,)+tuple(lo)]-self.Vext[(Ellipsis,)+tuple(hi)])
+        return -fmesh*self.G
+
     def forces_mesh(self): 
         """
         To get the forces, we simply take the gradient of the potential. 
-        To take the gradient, we use the central difference
         """
-        fmesh = np.zeros([2,self.size[0],self.size[1]])
-        V = self.pot()
-        fmesh[0] = 0.5*(np.roll(V,1,axis=0)-np.roll(V,-1,axis=0))
-        fmesh[1] = 0.5*(np.roll(V,1,axis=1)-np.roll(V,-1,axis=1))
-        
         #Multiply by gravitational constant and the densities to get the force
-        fmesh = -fmesh*self.densities*self.G
+        fmesh = self.field_mesh()*self.densities
         return fmesh 
     
     def forces_pctls(self):
         """
         Function to interpolate the forces using the inverse scheme of the 
-        NGP density scheme. 
+        density scheme. For NGP the force on the gridpoint is given to its particles 
+        as it always was, for CIC and TSC the field is interpolated with the 
+        assignment weights and multiplied by the mass of each particle.
+        With p3m, the short-range forces of the close pairs are added to the mesh ones.
+        The tree solver computes them directly from the particles instead.
+        Like the potential, the forces are kept in self.F until the particles move, so
+        the integrators can reuse the forces of the last kick. Do not modify them in place.
+        The potential energy of the pairs (tree, or short range of p3m) comes out of the 
+        same pass and is kept in self.Upp for energies().
         """
-        
-        fxy = np.moveaxis(self.forces_mesh(),0,-1)
+        if self.F is not None:
+            return self.F
+        if self.solver == 'tree':
+            self.F,self.Upp = tc.forces(self.posP,self.mass,self.soft,G=self.G,theta=self.theta,energy=True)
+        elif self.scheme == 'NGP':
+            self.F = dp.interpolate(self.forces_mesh(),self.flatPos,self.weights).reshape(self.posP.shape)
+        else:
+            f = dp.interpolate(self.field_mesh(),self.flatPos,self.weights)
+            self.F = f.reshape(self.posP.shape)*self.mass
+        if self.p3m:
+            F,self.Upp = self.short_range(energy=True)
+            self.F += F
+        #The tree code and the slabs work in float64
+        self.F = self.F.astype(self.dtype,copy=False)
+        self.nforces += 1
+        return self.F
+
+    def short_range(self,energy=False):
+        """
+        Short-range forces (and potential energy if energy is True) of the pairs closer 
+        than p3m.CUTOFF*r_split, see p3m.short_range()
+        """
+        method = self.p3m if isinstance(self.p3m,str) else 'auto'
+        return pm.short_range(self.posP,self.mass,self.size,self.soft,self.r_split,G=self.G,
+                               periodic=self.periodic,method=method,energy=energy)
 
-        f_final = fxy[self.mesh_modified]
-         
-        return f_final
+    def kick(self,F,dt):
+        """
+        Updates the velocities with the forces F over a time dt
+        """
+        self.velocityP += F*dt/self.mass
+
+    def push(self,F,dt_kick,dt_drift):
+        """
+        Kicks the velocities by dt_kick, drifts the positions by dt_drift with the new 
+        velocities and deposits the particles again. The building block of the 
+        integrators (see integrators.py).
+        """
+        if self.jit:
+            kr.push_deposit(self.posP,self.velocityP,self.mass,F,dt_drift,self.size,self.scheme,
+                            self.densities,self.flatPos,self.weights,parallel=self.jit=='parallel',
+                            periodic=self.periodic,dt_kick=dt_kick)
+            self.V = None
+            self.F = None
+            self.Upp = None
+        else:
+            self.posP,self.velocityP = ut.evolve(self.posP,self.velocityP,self.mass,F,dt_drift,
+                                                 self.size if self.periodic else None,dt_kick=dt_kick)
+            self.density_assignment()
     
+    def energies(self):
+        """
+        Kinetic and potential energy of the system, K = 0.5*sum(m*v**2) and 
+        P = -0.5*G*sum(rho*V), the energy the integrators conserve. The potential of the 
+        last force evaluation is reused (pot() only runs if the particles moved since, and 
+        then the next step reuses it), and P is a single dot product over the grid, so 
+        this is cheap enough to be called every step. With p3m, the short-range energy of 
+        the close pairs is added to the mesh one; with the tree solver, P is summed by 
+        the tree walk of the forces. The sums are done in float64 whatever dtype is.
+        Output(s):
+            - K, P (float): kinetic and potential energy (arrays with leading axes for an 
+            ensemble)
+        """
+        v = self.velocityP
+        K = 0.5*np.einsum('...p,...pi,...pi->...',self.mass.reshape(v.shape[:-1]),v,v,dtype=np.float64)
+        P = 0.
+        if self.solver == 'pm':
+            grid = 'abcdefgh'[:self.ndim]
+            P = -0.5*self.G*np.einsum(f'...{grid},...{grid}->...',self.densities,self.pot(),dtype=np.float64)
+        if self.solver == 'tree' or self.p3m:
+            if self.Upp is None:
+                self.forces_pctls()
+            P = P+self.Upp
+        return K[()],np.asarray(P)[()]
+
     def totalEnergy(self):
         """
         Function to compute the total energy of the system using
-        E = V+0.5*m*v**2
+        E = K+P, see energies()
         """
-        K = np.sum(self.mass*self.velocityP**2)
-        P = -0.5*np.sum(np.sum(self.pot())*self.densities)
+        K,P = self.energies()
         T = K + P
         return T 
     
-    def evolve(self,nsteps=1,file_save=None,file_save_pos=None):
+    def evolve(self,nsteps=1,file_save=None,file_save_pos=None,snapshot=None,checkpoint=None,diagnostics=None,energy_every=None):
         """
         Evolves the system and saves the energy along with position for further 
-        analysis. The evolution uses the leapfrog method, which is written in the 
-        util.py file
+        analysis. Each step is done by the integrator chosen in the constructor 
+        (see integrators.py), with the adaptive time step if courant was given.
         Input(s):
             - nsteps (int): how many steps per evolution before it saves a result
             - file_save (file): File in which we want to save the total energy of the system
             - file_save_pos (file,int): First entry is the file in which we want to save the 
             energy is, second entry is the number of particles we want to track.
+            Both files can be logger.AsyncLogger objects so the writing happens in the 
+            background instead of stalling the steps.
+            - snapshot (SnapshotWriter): binary store receiving the positions, velocities 
+            and energy after the steps (see snapshot.py). Faster than file_save_pos
+            - checkpoint (CheckpointWriter): saves the whole state every checkpoint.every 
+            steps, see from_checkpoint() to restart from it
+            - diagnostics (Diagnostics): measures the power spectrum and the statistics of
+            the densities every diagnostics.every steps (see diagnostics.py)
+            - energy_every (int): also measure the energy every that many steps (1 for 
+            every step) instead of only at the end. The kinetic and potential parts are 
+            appended to self.energy_log as (step, time, K, P), and file_save gets one 
+            line per measurement instead of one per call
         """
+        step = it.INTEGRATORS[self.integrator]
         for i in range(nsteps):
-            F = self.forces_pctls()
-            self.posP,self.velocityP = ut.evolve(self.posP,self.velocityP,self.mass,F,self.dt,self.size[0])
-
-            self.density_assignment()
+            dt = self.dt if self.courant is None else it.adaptive_dt(self,self.courant)
+            measure = diagnostics is not None and diagnostics.due(self.step+1)
+            if measure:
+                #So the FFT of the densities done by the step can be reused
+                diagnostics.arm(self)
+            step(self,dt)
+            self.step += 1
+            self.time += dt
+            if measure:
+                diagnostics.measure(self)
+            if energy_every and self.step % energy_every == 0:
+                K,P = self.energies()
+                self.energy_log.append((self.step,self.time,K,P))
+                if file_save is not None:
+                    file_save.write(f"{K+P}\n")
+            if checkpoint is not None and checkpoint.due(self.step):
+                checkpoint.write(self)
 
         energy = self.totalEnergy()
         if file_save is not None:
-            file_save.write(f"{energy}\n")
+            if not energy_every:
+                file_save.write(f"{energy}\n")
             file_save.flush()
         if file_save_pos is not None:
-            file_save_pos[0].write(f"{self.posP[:file_save_pos[1]]}\n")
+            #An AsyncLogger formats the positions in its own thread
+            if hasattr(file_save_pos[0],'write_array'):
+                file_save_pos[0].write_array(self.posP[:file_save_pos[1]])
+            else:
+                file_save_pos[0].write(f"{self.posP[:file_save_pos[1]]}\n")
             file_save_pos[0].flush()
+        if snapshot is not None:
+            snapshot.write(self.step,self.posP,self.velocityP,energy=energy,time=self.time)
         return energy,self.posP
\ No newline at end of file
@@ -0,0 +1,63 @@
+import queue
+import threading
+
+
+class BackgroundWorker:
+    def __init__(self,maxsize=8,name='nbody-io'):
+        """
+        Runs functions one after the other in a separate thread so the disk I/O of a
+        run overlaps the next steps of the simulation. The queue is bounded: if the
+        disk cannot keep up, submit() blocks instead of piling up copies in memory.
+        Input(s):
+            - maxsize (int): maximum number of pending jobs
+            - name (str): name of the thread
+        """
+        self.jobs = queue.Queue(maxsize=maxsize)
+        self.error = None
+        self.thread = threading.Thread(target=self._run,name=name,daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                self.jobs.task_done()
+                return
+            fun,args = job
+            try:
+                if self.error is None:
+                    fun(*args)
+            except Exception as e:
+                self.error = e
+            self.jobs.task_done()
+
+    def _check(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise RuntimeError('A background write failed') from error
+
+    def submit(self,fun,*args):
+        """
+        Queues fun(*args). The arguments must not be modified afterwards, so pass copies.
+        Raises the error of a previous job that failed, if any.
+        """
+        self._check()
+        if not self.thread.is_alive():
+            raise RuntimeError('The background worker was closed')
+        self.jobs.put((fun,args))
+
+    def wait(self):
+        """
+        Blocks until every queued job is done
+        """
+        self.jobs.join()
+        self._check()
+
+    def close(self):
+        """
+        Finishes the queued jobs and stops the thread
+        """
+        if self.thread.is_alive():
+            self.jobs.put(None)
+            self.thread.join()
+        self._check()
@@ -0,0 +1,144 @@
+import json
+import os
+import numpy as np
+
+from background import BackgroundWorker
+
+#Arguments of NBody saved along the state, so from_checkpoint() rebuilds the same run
+PARAMS = ['soft','G','boundary_type','fft_backend','workers','scheme','jit','integrator',
+          'courant','p3m','r_split','solver','theta','gradient']
+
+
+class State:
+    def __init__(self,data):
+        """
+        Positions, velocities and masses of a checkpoint, given to NBody like a
+        system_init object
+        """
+        self.pos = data['pos']
+        self.velocities = data['vel']
+        self.masses = data['mass']
+        self.rng = data.get('rng')
+
+
+def state(g,kernel=True):
+    """
+    Everything needed to carry on a run from where it is
+    Input(s):
+        - g (NBody): the simulation
+        - kernel (bool): also save the spectrum of the green function, so it is not
+        computed again on restart
+    Output(s):
+        - arrays (dict): copies of the arrays of the checkpoint
+    """
+    params = {k:getattr(g,k) for k in PARAMS}
+    params['size'] = list(g.size)
+    params['dt'] = g.dt
+    params['slabs'] = g.slab.workers if g.slab is not None else None
+    params['dtype'] = g.dtype.name
+    arrays = {'pos':g.posP,'vel':g.velocityP,'mass':np.asarray(g.mass),'step':g.step,
+              'time':g.time,'nforces':g.nforces,'params':json.dumps(params)}
+    if g.rng is not None:
+        arrays['rng'] = json.dumps(g.rng.bit_generator.state)
+    arrays = {k:np.array(v) for k,v in arrays.items()}
+    #The spectrum is replaced, never modified, when the parameters change so it is not copied
+    if kernel and g.solver == 'pm':
+        arrays['ffG'] = g.ffG
+    return arrays
+
+
+def save(file,arrays,compress=False):
+    """
+    Writes a checkpoint to a temporary file which then replaces the previous one, so
+    a run dying halfway through the writing never leaves a broken checkpoint behind
+    Input(s):
+        - file (str): path of the checkpoint (.npz)
+        - arrays (dict): output of state()
+        - compress (bool): zip-compress the arrays (smaller, but slower to write)
+    """
+    tmp = file+'.tmp'
+    with open(tmp,'wb') as f:
+        if compress:
+            np.savez_compressed(f,**arrays)
+        else:
+            np.savez(f,**arrays)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp,file)
+
+
+def load(file):
+    """
+    Reads a checkpoint written by save()
+    Input(s):
+        - file (str): path of the checkpoint
+    Output(s):
+        - data (dict): arrays of the checkpoint, with params as a dict, the counters as
+        numbers and rng as a numpy.random.Generator (None if there was none)
+    """
+    with np.load(file) as f:
+        data = {k:f[k] for k in f.files}
+    data['params'] = json.loads(str(data['params']))
+    for k in ('step','nforces'):
+        data[k] = int(data[k])
+    data['time'] = float(data['time'])
+    rng = None
+    if 'rng' in data:
+        rng_state = json.loads(str(data['rng']))
+        rng = np.random.Generator(getattr(np.random,rng_state['bit_generator'])())
+        rng.bit_generator.state = rng_state
+    data['rng'] = rng
+    return data
+
+
+class CheckpointWriter:
+    def __init__(self,file,every=100,compress=False,kernel=True,asynchronous=True):
+        """
+        Saves the state of a run every few steps when given to NBody.evolve(). Each
+        checkpoint replaces the previous one, see NBody.from_checkpoint() to restart.
+        Input(s):
+            - file (str): path of the checkpoint (.npz)
+            - every (int): number of steps between two checkpoints
+            - compress (bool): zip-compress the arrays
+            - kernel (bool): save the spectrum of the green function too
+            - asynchronous (bool): write in a background thread, so the I/O overlaps
+            the next steps of the simulation
+        """
+        folder = os.path.dirname(os.path.abspath(file))
+        os.makedirs(folder,exist_ok=True)
+        self.file = file
+        self.every = every
+        self.compress = compress
+        self.kernel = kernel
+        #Only one checkpoint can wait, the next one blocks until it is on disk
+        self.worker = BackgroundWorker(1,name='nbody-checkpoint') if asynchronous else None
+
+    def due(self,step):
+        return self.every is not None and step % self.every == 0
+
+    def write(self,g):
+        """
+        Saves the current state of g. The arrays are copied right away.
+        """
+        arrays = state(g,kernel=self.kernel)
+        if self.worker is None:
+            save(self.file,arrays,self.compress)
+        else:
+            self.worker.submit(save,self.file,arrays,self.compress)
+
+    def flush(self):
+        """
+        Waits until every checkpoint given so far is on disk
+        """
+        if self.worker is not None:
+            self.worker.wait()
+
+    def close(self):
+        if self.worker is not None:
+            self.worker.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*args):
+        self.close()
@@ -0,0 +1,106 @@
+import itertools
+import numpy as np
+
+SCHEMES = ('NGP','CIC','TSC')
+
+
+def _axis_stencil(x,n,scheme,periodic=True):
+    """
+    One dimensional assignment stencil of a scheme. The gridpoints sit on integer
+    coordinates (cells of unit length).
+    Input(s):
+        - x (array): coordinate of the particles along one axis
+        - n (int): number of gridpoints along that axis
+        - scheme (str): NGP, CIC or TSC
+        - periodic (bool): wrap the gridpoints around the grid. Otherwise the box ends
+        at the last gridpoint n-1 and the gridpoints falling outside of it get a weight
+        of 0 (that mass left the box): an NGP particle beyond n-0.5, or the upper CIC
+        weight of one in (n-1, n), deposits nothing and feels no force from it
+    Output(s):
+        - idx (array): (npart, width) gridpoints touched by each particle
+        - w (array): (npart, width) fraction of the mass given to those gridpoints
+    """
+    if scheme == 'NGP':
+        idx = np.rint(x).astype(np.int64)[:,None]
+        w = np.ones(idx.shape,dtype=x.dtype)
+    elif scheme == 'CIC':
+        base = np.floor(x)
+        f = x-base
+        idx = base.astype(np.int64)[:,None]+np.arange(2)
+        w = np.stack((1-f,f),axis=-1)
+    elif scheme == 'TSC':
+        near = np.rint(x)
+        d = x-near
+        idx = near.astype(np.int64)[:,None]+np.arange(-1,2)
+        w = np.stack((0.5*(0.5-d)**2,0.75-d**2,0.5*(0.5+d)**2),axis=-1)
+    else:
+        raise ValueError(f'Unknown assignment scheme {scheme}, choose from {SCHEMES}')
+    if periodic:
+        return idx % n, w
+    outside = (idx < 0) | (idx >= n)
+    return np.clip(idx,0,n-1), np.where(outside,0.,w)
+
+
+def stencil(posP,shape,scheme='NGP',periodic=True):
+    """
+    Computes, for every particle, the flat index of all the gridpoints it is assigned to
+    along with the weight of each of them. This is shared by the deposition and the
+    interpolation so both are the exact inverse of each other.
+    Input(s):
+        - posP (array): (npart, ndim) positions of the particles
+        - shape (tuple): shape of the grid
+        - scheme (str): NGP (nearest grid point), CIC (cloud-in-cell) or
+        TSC (triangular-shaped-cloud)
+        - periodic (bool): False for isolated boxes, see _axis_stencil()
+    Output(s):
+        - flat (array): (npart, width**ndim) flat indices into the grid
+        - w (array): (npart, width**ndim) weights of those gridpoints (they sum to 1 inside the box)
+    """
+    ndim = len(shape)
+    strides = np.cumprod((1,)+tuple(shape[:0:-1]))[::-1]
+    axes = [_axis_stencil(posP[:,i],shape[i],scheme,periodic) for i in range(ndim)]
+    width = axes[0][0].shape[1]
+
+    flat = []
+    w = []
+    for corner in itertools.product(range(width),repeat=ndim):
+        f = axes[0][0][:,corner[0]]*strides[0]
+        c = axes[0][1][:,corner[0]]
+        for i in range(1,ndim):
+            f = f+axes[i][0][:,corner[i]]*strides[i]
+            c = c*axes[i][1][:,corner[i]]
+        flat.append(f)
+        w.append(c)
+    return np.stack(flat,axis=-1), np.stack(w,axis=-1)
+
+
+def deposit(flat,w,mass,shape,dtype=None):
+    """
+    Bins the mass of the particles on the grid with np.bincount.
+    Input(s):
+        - flat, w (array): output of stencil()
+        - mass (array): masses of the particles (any shape with npart elements)
+        - shape (tuple): shape of the grid
+        - dtype: float type of the grid. bincount always sums in float64, the grid
+        is only rounded once at the end (float64 if None)
+    Output(s):
+        - rho (array): mass on each gridpoint
+    """
+    weights = w*np.reshape(mass,(-1,1))
+    rho = np.bincount(flat.ravel(),weights=weights.ravel(),minlength=int(np.prod(shape)))
+    if dtype is not None:
+        rho = rho.astype(dtype,copy=False)
+    return rho.reshape(shape)
+
+
+def interpolate(field,flat,w):
+    """
+    Inverse of deposit(): reads a (vector) field at the positions of the particles.
+    Input(s):
+        - field (array): (ncomp, *shape) field on the grid
+        - flat, w (array): output of stencil()
+    Output(s):
+        - f (array): (npart, ncomp) field felt by each particle
+    """
+    field = field.reshape(field.shape[0],-1)
+    return np.einsum('cpk,pk->pc',field[:,flat],w)
@@ -0,0 +1,196 @@
+import numpy as np
+
+import initial_conditions as ic
+
+
+class PowerSpectrum:
+    def __init__(self,shape,nbins=None,kmax=np.pi):
+        """
+        Radial binning of the spectrum of a grid (rfftn layout). The bin of every mode is
+        found once here, so binning a spectrum is a single bincount. The modes of the
+        last axis that stand for both +k and -k are counted twice.
+        Input(s):
+            - shape (tuple): shape of the real grid that was transformed
+            - nbins (int): number of bins of |k| (half the smallest side if None, i.e.
+            bins as wide as the fundamental mode of that side)
+            - kmax (float): upper edge of the last bin (radians per cell, the Nyquist
+            frequency by default). The modes beyond it and k = 0 are left out
+        """
+        self.shape = tuple(shape)
+        self.ndim = len(self.shape)
+        self.nbins = min(self.shape)//2 if nbins is None else nbins
+        k = ic.wavenumbers(self.shape)
+        kmag = np.sqrt(sum(ki**2 for ki in k))
+        self.edges = np.linspace(0,kmax,self.nbins+1)
+        #Bins are (lo,hi], so the fundamental mode falls in the first one
+        index = np.ceil(kmag/self.edges[1]).astype(np.intp)-1
+        index[(index < 0) | (index >= self.nbins)] = self.nbins
+        self.index = index.ravel()
+        n = self.shape[-1]
+        twice = np.full(n//2+1,2.)
+        twice[0] = 1
+        if n % 2 == 0:
+            twice[-1] = 1
+        self.twice = np.broadcast_to(twice,kmag.shape).ravel()
+        self.modes = np.bincount(self.index,weights=self.twice,minlength=self.nbins+1)[:self.nbins]
+        with np.errstate(invalid='ignore'):
+            self.k = np.bincount(self.index,weights=self.twice*kmag.ravel(),minlength=self.nbins+1)[:self.nbins]/self.modes
+
+    def __call__(self,ffD):
+        """
+        Power spectrum of the density contrast delta = rho/mean-1, P(k) = |delta_k|**2/N
+        averaged over the modes of each bin (cells of unit length, N cells)
+        Input(s):
+            - ffD (array): rfftn of the densities, with any leading (batch) axes
+        Output(s):
+            - P (array): (*lead, nbins) power in each bin (nan for a bin without modes)
+        """
+        lead = ffD.shape[:-self.ndim]
+        members = int(np.prod(lead))
+        ffD = ffD.reshape((members,-1))
+        power = (ffD.real**2+ffD.imag**2)*self.twice
+        #One bincount for all the members, whose bins are offset from each other
+        index = self.index+(self.nbins+1)*np.arange(members)[:,None]
+        P = np.bincount(index.ravel(),weights=power.ravel(),minlength=members*(self.nbins+1))
+        P = P.reshape(members,self.nbins+1)[:,:self.nbins]
+        #The k = 0 mode is the total mass, which sets the mean density
+        total = ffD[:,0].real
+        with np.errstate(divide='ignore',invalid='ignore'):
+            P = P/self.modes*(np.prod(self.shape)/total**2)[:,None]
+        return P.reshape(lead+(self.nbins,))
+
+
+def density_moments(densities,ndim):
+    """
+    Moments of the density contrast delta = rho/mean-1 over the gridpoints, summed in
+    float64. The grid axes are the last ndim ones, leading axes are kept
+    Output(s):
+        - moments (dict): mean density, variance, skewness and kurtosis (excess) of
+        delta, and the fraction of empty gridpoints
+    """
+    axes = tuple(range(-ndim,0))
+    mean = np.mean(densities,axis=axes,dtype=np.float64)
+    expand = mean.reshape(mean.shape+(1,)*ndim)
+    with np.errstate(divide='ignore',invalid='ignore'):
+        delta = densities/expand-1
+        var = np.mean(delta**2,axis=axes,dtype=np.float64)
+        skew = np.mean(delta**3,axis=axes,dtype=np.float64)/var**1.5
+        kurt = np.mean(delta**4,axis=axes,dtype=np.float64)/var**2-3
+    empty = np.mean(densities == 0,axis=axes,dtype=np.float64)
+    return {'mean':mean,'variance':var,'skewness':skew,'kurtosis':kurt,'empty':empty}
+
+
+def density_pdf(densities,ndim,edges):
+    """
+    Fraction of the gridpoints in each bin of log10(rho/mean). The empty gridpoints
+    are not in any bin (see density_moments())
+    Input(s):
+        - densities (array): grid(s), the grid axes being the last ndim ones
+        - edges (array): edges of the bins of log10(rho/mean)
+    Output(s):
+        - pdf (array): (*lead, len(edges)-1) fraction of the gridpoints in each bin
+    """
+    lead = densities.shape[:-ndim]
+    members = int(np.prod(lead))
+    rho = densities.reshape((members,-1))
+    mean = np.mean(rho,axis=1,dtype=np.float64)[:,None]
+    nbins = len(edges)-1
+    with np.errstate(divide='ignore',invalid='ignore'):
+        index = np.searchsorted(edges,np.log10(rho/mean),side='right')-1
+    #The empty gridpoints (-inf) and the ones outside the edges go to an extra bin
+    index[(index < 0) | (index >= nbins)] = nbins
+    index += (nbins+1)*np.arange(members)[:,None]
+    pdf = np.bincount(index.ravel(),minlength=members*(nbins+1)).reshape(members,nbins+1)
+    return (pdf[:,:nbins]/rho.shape[1]).reshape(lead+(nbins,))
+
+
+class Diagnostics:
+    def __init__(self,every=10,writer=None,nbins=None,edges=np.linspace(-3,3,61)):
+        """
+        Measures the power spectrum and the one point statistics of the densities every
+        few steps when given to NBody.evolve(). In a Periodic box with the mesh solver,
+        the spectrum of the densities is taken from pot() on the step it is measured,
+        so it costs no extra FFT: every pot() of the step copies its spectrum into one
+        buffer (yoshida4 calls it three times) and only the last one, that of the
+        densities measured, is binned. Otherwise (Non-Periodic, whose FFTs are on the
+        padded grid, the slabs or the tree code) the densities are transformed here.
+        The measurements are kept in self.history and written to writer if given.
+        Input(s):
+            - every (int): number of steps between two measurements
+            - writer (SnapshotWriter): receives step, time, k, power, pdf and the moments
+            of density_moments() for each measurement, e.g. a folder next to the snapshots
+            - nbins (int): number of bins of the power spectrum, see PowerSpectrum
+            - edges (array): bins of log10(rho/mean) of the density PDF
+        """
+        self.every = every
+        self.writer = writer
+        self.nbins = nbins
+        self.edges = np.asarray(edges,dtype=float)
+        self.spectrum = None
+        self.ffD = None
+        self.captured = False
+        self.history = []
+
+    def due(self,step):
+        return self.every is not None and step % self.every == 0
+
+    def _shared(self,g):
+        """
+        Whether pot() transforms exactly the densities (and can hand over their spectrum)
+        """
+        return g.solver == 'pm' and g.periodic and g.slab is None
+
+    def _setup(self,g):
+        if self.spectrum is None or self.spectrum.shape != g.size:
+            self.spectrum = PowerSpectrum(g.size,self.nbins)
+
+    def arm(self,g):
+        """
+        Makes the pot() calls of g hand over their density spectrum, call it before the
+        step that will be measured. Each one overwrites the buffer, so the last one is
+        that of the densities measured
+        """
+        self._setup(g)
+        if self._shared(g):
+            g._ffD_sink = self._capture
+
+    def _capture(self,ffD):
+        #Copied, since pot() multiplies ffD in place (and pyfftw reuses it). Binning waits
+        #for measure(), so the spectra of the earlier force solves cost a copy only
+        if self.ffD is None or self.ffD.shape != ffD.shape or self.ffD.dtype != ffD.dtype:
+            self.ffD = np.empty_like(ffD)
+        np.copyto(self.ffD,ffD)
+        self.captured = True
+
+    def measure(self,g):
+        """
+        Measures the current densities of g
+        Output(s):
+            - record (dict): step, time, k, power, pdf and the moments
+        """
+        self.arm(g)
+        if self._shared(g):
+            #Does nothing if the potential of these densities was computed already
+            g.pot()
+            g._ffD_sink = None
+        if self.captured:
+            power = self.spectrum(self.ffD)
+        else:
+            power = self.spectrum(np.fft.rfftn(g.densities,axes=tuple(range(-g.ndim,0))))
+        self.captured = False
+        record = {'step':g.step,'time':g.time,'k':self.spectrum.k,'power':power,
+                  'pdf':density_pdf(g.densities,g.ndim,self.edges)}
+        record.update(density_moments(g.densities,g.ndim))
+        self.history.append(record)
+        if self.writer is not None:
+            self.writer.write(g.step,None,time=g.time,**{k:v for k,v in record.items() if k not in ('step','time')})
+        return record
+
+    def as_arrays(self):
+        """
+        Output(s):
+            - history (dict): every quantity of self.history stacked along a first axis
+        """
+        if not self.history:
+            return {}
+        return {k:np.array([r[k] for r in self.history]) for k in self.history[0]}
@@ -0,0 +1,72 @@
+import numpy as np
+
+import NBody as nb
+import deposition as dp
+import fft_backend as fb
+
+
+class _Stack:
+    def __init__(self,particleLists):
+        """
+        Stacks the positions, velocities and masses of several systems along a leading
+        axis, so they can be given to NBody like a single system_init object
+        """
+        npart = {len(p.pos) for p in particleLists}
+        if len(npart) != 1:
+            raise ValueError(f'Every member of an ensemble needs the same number of particles, got {sorted(npart)}')
+        npart = npart.pop()
+        self.pos = np.stack([np.asarray(p.pos,dtype=float) for p in particleLists])
+        self.velocities = np.stack([np.asarray(p.velocities,dtype=float) for p in particleLists])
+        self.masses = np.stack([np.broadcast_to(np.asarray(p.masses,dtype=float).reshape(-1,1),(npart,1))
+                                for p in particleLists])
+
+
+class Ensemble(nb.NBody):
+    def __init__(self,size,particleLists,dt,**kwargs):
+        """
+        K independent realizations of the same configuration (e.g. different seeds),
+        evolved together. Every array gets a leading axis of length K: posP[K,npart,ndim],
+        densities[K,*size], ... so each step does one batched FFT of the K grids with the
+        shared green function spectrum, one deposition and one push for all of them.
+        Takes the same options as NBody (apart from jit, p3m, slabs and solver='tree') and
+        evolve() works the same way, the energies are just one per member (energies() 
+        sums over the particles and the grid of each member).
+        Input(s):
+            - size (tuple): size of the grid of every member
+            - particleLists (list): system_init objects (or anything with pos, velocities
+            and masses), all with the same number of particles
+            - dt (float): step in time taken in the simulation. With courant, the step is
+            shared by the members, so the most demanding one sets it
+            - kwargs: options of NBody
+        """
+        if kwargs.get('jit') or kwargs.get('p3m') or kwargs.get('slabs') or kwargs.get('solver','pm') != 'pm':
+            raise ValueError('An ensemble only runs the plain mesh solver (no jit, p3m, slabs or tree)')
+        self.members = len(particleLists)
+        super().__init__(size,_Stack(particleLists),dt,**kwargs)
+
+    def kernel_spectrum(self):
+        """
+        Same spectrum as NBody.kernel_spectrum(), but the FFT backend of pot() is then
+        set up for the K grids at once
+        """
+        key = self._kernel_key
+        ffG = super().kernel_spectrum()
+        if key != self._kernel_key:
+            self.fft = fb.get_backend(self.fft_backend,self.fft_shape,workers=self.workers,
+                                      batch=self.members,dtype=self.dtype)
+        return ffG
+
+    def density_assignment(self):
+        """
+        Deposits the K systems on K grids with a single bincount: the flat gridpoint
+        indices of member k are offset by k times the number of gridpoints, so
+        forces_pctls() also interpolates all of them at once.
+        """
+        K,npart,ndim = self.posP.shape
+        flat,w = dp.stencil(self.posP.reshape(-1,ndim),self.size,self.scheme,periodic=self.periodic)
+        flat += np.repeat(np.arange(K)*int(np.prod(self.size)),npart)[:,None]
+        self.flatPos, self.weights = flat, w
+        self.densities = dp.deposit(flat,w,self.mass,(K,)+self.size,dtype=self.dtype)
+        self.V = None
+        self.F = None
+        self.Upp = None
@@ -0,0 +1,140 @@
+import os
+import numpy as np
+
+try:
+    import scipy.fft as sfft
+except ImportError:
+    sfft = None
+
+try:
+    import pyfftw
+except ImportError:
+    pyfftw = None
+
+
+class NumpyFFT:
+    name = 'numpy'
+
+    def __init__(self,shape,workers=1,batch=None,dtype=np.float64):
+        """
+        Plain single threaded numpy transforms (what pot() always used). Like scipy, 
+        they keep float32 grids in single precision.
+        Input(s):
+            - shape (tuple): shape of the real grid that is transformed. Smaller inputs
+            are zero-padded to it (used for the Non-Periodic convolution)
+            - workers (int): ignored, numpy's fft can only use one thread
+            - batch (int): ignored, the transforms are done over the last len(shape) axes
+            so any number of grids stacked along leading axes is transformed at once
+            - dtype: ignored, the transforms follow the type of their input
+        """
+        self.shape = tuple(shape)
+        self.axes = tuple(range(-len(self.shape),0))
+        self.workers = 1
+
+    def rfftn(self,a):
+        return np.fft.rfftn(a,s=self.shape,axes=self.axes)
+
+    def irfftn(self,a):
+        return np.fft.irfftn(a,s=self.shape,axes=self.axes)
+
+
+class ScipyFFT:
+    name = 'scipy'
+
+    def __init__(self,shape,workers=1,batch=None,dtype=np.float64):
+        """
+        Transforms done with scipy.fft, which can split the work over several threads.
+        Input(s):
+            - shape (tuple): shape of the real grid that is transformed
+            - workers (int): number of threads used per transform (-1 uses all the cores)
+            - batch (int): ignored, like for NumpyFFT
+            - dtype: ignored, like for NumpyFFT
+        """
+        if sfft is None:
+            raise ImportError('scipy is needed for the scipy FFT backend')
+        self.shape = tuple(shape)
+        self.axes = tuple(range(-len(self.shape),0))
+        self.workers = workers
+
+    def rfftn(self,a):
+        return sfft.rfftn(a,s=self.shape,axes=self.axes,workers=self.workers)
+
+    def irfftn(self,a):
+        #The spectrum is a temporary in pot(), so scipy is allowed to destroy it
+        return sfft.irfftn(a,s=self.shape,axes=self.axes,workers=self.workers,overwrite_x=True)
+
+
+class FFTWBackend:
+    name = 'pyfftw'
+
+    def __init__(self,shape,workers=1,batch=None,dtype=np.float64,effort='FFTW_MEASURE'):
+        """
+        Transforms done with pyFFTW. Both directions are planned once on aligned buffers
+        that are reused for every call, so no new arrays get allocated during a run.
+        Note that the returned arrays are those buffers: they are overwritten by the
+        next transform, copy them if they need to be kept.
+        Input(s):
+            - shape (tuple): shape of the real grid that is transformed
+            - workers (int): number of threads used per transform (-1 uses all the cores)
+            - batch (int): number of grids transformed together (stacked along a leading
+            axis), the buffers are planned for exactly that many
+            - dtype: float type of the real buffer (float32 plans single precision
+            transforms on complex64 spectra)
+            - effort (str): FFTW planning flag
+        """
+        if pyfftw is None:
+            raise ImportError('pyfftw is needed for the pyfftw FFT backend')
+        self.shape = tuple(shape)
+        if workers == -1:
+            workers = os.cpu_count()
+        self.workers = workers
+        lead = () if batch is None else (batch,)
+        cshape = self.shape[:-1]+(self.shape[-1]//2+1,)
+        dtype = np.dtype(dtype)
+        self.real = pyfftw.empty_aligned(lead+self.shape,dtype=dtype)
+        self.cplx = pyfftw.empty_aligned(lead+cshape,dtype=np.result_type(dtype,np.complex64))
+        axes = tuple(range(-len(self.shape),0))
+        self.forward = pyfftw.FFTW(self.real,self.cplx,axes=axes,threads=workers,flags=(effort,))
+        self.backward = pyfftw.FFTW(self.cplx,self.real,axes=axes,threads=workers,
+                                    direction='FFTW_BACKWARD',flags=(effort,))
+
+    def rfftn(self,a):
+        if a.shape == self.real.shape:
+            self.real[...] = a
+        else:
+            #The backward transform overwrites the padding, so it is zeroed every time
+            self.real.fill(0)
+            self.real[tuple(slice(0,n) for n in a.shape)] = a
+        return self.forward()
+
+    def irfftn(self,a):
+        if a is not self.cplx:
+            self.cplx[...] = a
+        return self.backward()
+
+
+BACKENDS = {'numpy':NumpyFFT,'scipy':ScipyFFT,'pyfftw':FFTWBackend}
+
+
+def get_backend(name,shape,workers=1,batch=None,dtype=np.float64):
+    """
+    Builds the FFT backend used by NBody.pot().
+    Input(s):
+        - name (str): 'numpy', 'scipy', 'pyfftw' or 'auto' (fastest one installed)
+        - shape (tuple): shape of the real grid that is transformed
+        - workers (int): number of threads per transform
+        - batch (int): number of grids stacked along a leading axis (None for one grid)
+        - dtype: float type of the grids (float64 or float32)
+    Output(s):
+        - backend: object with rfftn() and irfftn() methods
+    """
+    if name == 'auto':
+        if pyfftw is not None:
+            name = 'pyfftw'
+        elif sfft is not None:
+            name = 'scipy'
+        else:
+            name = 'numpy'
+    if name not in BACKENDS:
+        raise ValueError(f'Unknown FFT backend {name}, choose from {list(BACKENDS)} or auto')
+    return BACKENDS[name](shape,workers=workers,batch=batch,dtype=dtype)
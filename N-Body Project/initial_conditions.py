@@ -0,0 +1,140 @@
+import numpy as np
+
+
+def power_law(index=-3,amplitude=1.0):
+    """
+    Power spectrum P(k) = amplitude*k**index, with P(0) = 0 (no mean overdensity)
+    """
+    def P(k):
+        with np.errstate(divide='ignore'):
+            p = amplitude*np.where(k>0,k,1.)**index
+        return np.where(k>0,p,0.)
+    return P
+
+
+def wavenumbers(shape):
+    """
+    Wavenumbers (in radians per cell) of the rfftn layout of a grid, as one open array
+    per axis (the last axis only has the positive half).
+    """
+    ndim = len(shape)
+    k = []
+    for i,n in enumerate(shape):
+        ki = 2*np.pi*(np.fft.rfftfreq(n) if i == ndim-1 else np.fft.fftfreq(n))
+        k.append(ki.reshape([-1 if j == i else 1 for j in range(ndim)]))
+    return k
+
+
+def gaussian_random_field(shape,power,seed=None,rng=None,chunk=64):
+    """
+    Generates the Fourier modes of a Gaussian random field with a given power spectrum.
+    The modes are drawn directly in the rfftn layout (one slab of chunk planes at a time,
+    so the temporaries stay small), hence a single inverse FFT gives the field. The
+    field only depends on the seed, not on chunk.
+    Input(s):
+        - shape (tuple): shape of the grid
+        - power (function): P(k) with k in radians per cell, P in units of cell volume
+        - seed (int): seed of the random generator (ignored if rng is given)
+        - rng (numpy.random.Generator): generator to draw from
+        - chunk (int): number of planes along the first axis drawn at once
+    Output(s):
+        - delta_k (array): Fourier modes of the field, np.fft.irfftn(delta_k,s=shape) is
+        the overdensity on the grid (axes=range(len(shape)) with numpy 2)
+    """
+    if rng is None:
+        rng = np.random.default_rng(seed)
+    k = wavenumbers(shape)
+    ncells = np.prod(shape)
+    cshape = tuple(shape[:-1])+(shape[-1]//2+1,)
+    delta_k = np.empty(cshape,dtype=complex)
+    for lo in range(0,cshape[0],chunk):
+        hi = min(cshape[0],lo+chunk)
+        kk = k[0][lo:hi]**2
+        for ki in k[1:]:
+            kk = kk+ki**2
+        amp = np.sqrt(0.5*ncells*power(np.sqrt(kk)))
+        #Real and imaginary parts interleaved, so the field does not depend on chunk
+        noise = rng.standard_normal((hi-lo,)+cshape[1:]+(2,))
+        delta_k[lo:hi] = amp*(noise[...,0]+1j*noise[...,1])
+    #The planes k_last = 0 (and Nyquist) hold both k and -k: make them Hermitian,
+    #otherwise irfftn keeps only half of their power. The real modes get sqrt(2)
+    for j in ([0,-1] if shape[-1] % 2 == 0 and shape[-1] > 1 else [0]):
+        plane = delta_k[...,j]
+        mirror = plane
+        for axis in range(plane.ndim):
+            mirror = np.roll(np.flip(mirror,axis),1,axis)
+        delta_k[...,j] = (plane+np.conj(mirror))/np.sqrt(2)
+    return delta_k
+
+
+def zeldovich_displacement(delta_k,shape):
+    """
+    Displacement field psi of the Zel'dovich approximation (delta = -div psi), i.e.
+    psi_k = i k delta_k/k**2, one inverse FFT per axis. The Nyquist modes are left out
+    of the derivative since i*k is not defined there for a real field.
+    Output(s):
+        - psi (array): (ndim, *shape) displacement of every gridpoint in cells
+    """
+    k = wavenumbers(shape)
+    kk = k[0]**2
+    for ki in k[1:]:
+        kk = kk+ki**2
+    kk[(0,)*len(shape)] = 1.
+    axes = tuple(range(len(shape)))
+    psi = np.empty((len(shape),)+tuple(shape))
+    for i in range(len(shape)):
+        ki = k[i].copy()
+        if shape[i] % 2 == 0:
+            ki.flat[shape[i]//2] = 0
+        psi[i] = np.fft.irfftn(1j*ki/kk*delta_k,s=shape,axes=axes)
+    return psi
+
+
+class cosmos_init:
+    def __init__(self,size,mass,power=None,stride=1,growth=1.0,velocity_factor=0.0,seed=None,chunk=64):
+        """
+        Cosmological initial conditions: a lattice of particles (one every stride cells
+        along each axis) displaced with the Zel'dovich approximation from a Gaussian
+        random field. Has the same pos, velocities and masses arrays as
+        particle.system_init, so it can be given to NBody directly.
+        Input(s):
+            - size (tuple): size of the grid
+            - mass (float): mass of each particle
+            - power (function): power spectrum P(k), see gaussian_random_field()
+            (power_law(-3) if None, like the P4.py run)
+            - stride (int): spacing of the lattice in cells (must divide the size)
+            - growth (float): growth factor multiplying the displacements
+            - velocity_factor (float): velocities are velocity_factor*growth*psi
+            (f*H in cosmology, 0 starts the particles at rest)
+            - seed (int): seed of the random generator
+            - chunk (int): number of lattice planes filled at once
+        """
+        size = tuple(size)
+        if any(n % stride for n in size):
+            raise ValueError(f'The stride {stride} must divide the size of the grid {size}')
+        if power is None:
+            power = power_law(-3)
+        self.boundary_type = 'Periodic'
+        self.cosmos = True
+        self.rng = np.random.default_rng(seed)
+        ndim = len(size)
+
+        self.delta_k = gaussian_random_field(size,power,rng=self.rng,chunk=chunk)
+        psi = zeldovich_displacement(self.delta_k,size)[(slice(None),)+(slice(None,None,stride),)*ndim]
+
+        lattice = psi.shape[1:]
+        npart = int(np.prod(lattice))
+        per_plane = npart//lattice[0]
+        self.nparticles = npart
+        self.pos = np.empty((npart,ndim))
+        self.velocities = np.empty((npart,ndim))
+        #Filled by slabs of planes, so the only temporaries are the size of a slab
+        for lo in range(0,lattice[0],chunk):
+            hi = min(lattice[0],lo+chunk)
+            rows = slice(lo*per_plane,hi*per_plane)
+            q = np.indices((hi-lo,)+lattice[1:]).reshape(ndim,-1).T*stride
+            q[:,0] += lo*stride
+            disp = growth*psi[:,lo:hi].reshape(ndim,-1).T
+            self.pos[rows] = (q+disp) % np.asarray(size)
+            self.velocities[rows] = velocity_factor*disp
+        self.masses = np.full((npart,1),float(mass))
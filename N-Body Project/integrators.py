@@ -0,0 +1,68 @@
+import numpy as np
+
+
+def euler(g,dt):
+    """
+    The original scheme of NBody: kick the velocities with the forces of the current
+    positions, then drift the positions with the new velocities. First order, but only
+    one force evaluation per step.
+    Input(s):
+        - g (NBody): the simulation
+        - dt (float): time step
+    """
+    g.push(g.forces_pctls(),dt,dt)
+
+
+def kdk(g,dt):
+    """
+    Kick-drift-kick leapfrog: half kick, full drift, half kick with the forces at the
+    new positions. Second order and symplectic, so the energy oscillates instead of
+    drifting. The forces of the last half kick are kept by forces_pctls() and start the
+    next step, so it still costs one force evaluation per step.
+    """
+    g.push(g.forces_pctls(),0.5*dt,dt)
+    g.kick(g.forces_pctls(),0.5*dt)
+
+
+#Yoshida (1990) coefficients of the 4th order composition of three leapfrog steps
+_W1 = 1/(2-2**(1/3))
+_W0 = -2**(1/3)*_W1
+_KICKS = (0.5*_W1,0.5*(_W0+_W1),0.5*(_W0+_W1),0.5*_W1)
+_DRIFTS = (_W1,_W0,_W1)
+
+def yoshida4(g,dt):
+    """
+    4th order symplectic integrator (Yoshida 1990) written as kick-drift-kick.
+    Three force evaluations per step (the last kick reuses its forces next step),
+    worth it when the energy has to be conserved much better than with kdk.
+    """
+    for c,d in zip(_KICKS[:-1],_DRIFTS):
+        g.push(g.forces_pctls(),c*dt,d*dt)
+    g.kick(g.forces_pctls(),_KICKS[-1]*dt)
+
+
+INTEGRATORS = {'euler':euler,'kdk':kdk,'yoshida4':yoshida4}
+
+
+def adaptive_dt(g,courant):
+    """
+    Time step limited so that no particle moves by more than courant cells in one
+    step, neither from its velocity (dt < courant/|v|) nor from its acceleration
+    (dt < sqrt(courant/|a|)). Never longer than g.dt.
+    The forces are kept by forces_pctls(), so they are reused by the step that follows.
+    Note that changing the step breaks the symplecticity of kdk and yoshida4, the
+    energy is only conserved as well as the steps are small.
+    Input(s):
+        - g (NBody): the simulation
+        - courant (float): fraction of a cell a particle can move in one step
+    Output(s):
+        - dt (float): time step to use
+    """
+    dt = g.dt
+    vmax = np.max(np.abs(g.velocityP)) if len(g.velocityP) else 0.
+    amax = np.max(np.abs(g.forces_pctls()/g.mass)) if len(g.velocityP) else 0.
+    if vmax > 0:
+        dt = min(dt,courant/vmax)
+    if amax > 0:
+        dt = min(dt,np.sqrt(courant/amax))
+    return dt
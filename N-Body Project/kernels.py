@@ -0,0 +1,129 @@
+import numpy as np
+import deposition as dp
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+def _push_numpy(posP,velocityP,mass,F,dt,dt_kick,shape,scheme,rho,flat,w,periodic=True):
+    """
+    Pure numpy version of the fused step, used when numba is not installed or when
+    the scheme/dimension has no compiled kernel. Works in place as much as numpy allows.
+    """
+    velocityP += F*dt_kick/mass
+    posP += velocityP*dt
+    if periodic:
+        np.mod(posP,shape,out=posP)
+    flat[...], w[...] = dp.stencil(posP,shape,scheme,periodic=periodic)
+    rho[...] = dp.deposit(flat,w,mass,shape)
+
+
+if numba is not None:
+
+    @numba.njit(cache=True)
+    def _ngp_range(lo,hi,posP,velocityP,mass,F,dt,dt_kick,n0,n1,rho,flat,w):
+        """
+        Kick, drift, periodic wrap and NGP assignment of the particles lo to hi. The
+        stencil is stored like deposition.stencil() does so forces_pctls() can reuse it.
+        """
+        for p in range(lo,hi):
+            kick = dt_kick/mass[p,0]
+            vx = velocityP[p,0]+F[p,0]*kick
+            vy = velocityP[p,1]+F[p,1]*kick
+            velocityP[p,0], velocityP[p,1] = vx, vy
+            x = (posP[p,0]+vx*dt) % n0
+            y = (posP[p,1]+vy*dt) % n1
+            posP[p,0], posP[p,1] = x, y
+            #Read back, so float32 positions get the stencil of their rounded value
+            x, y = posP[p,0], posP[p,1]
+
+            c = (int(np.rint(x)) % n0)*n1+int(np.rint(y)) % n1
+            flat[p,0], w[p,0] = c, 1.0
+            rho[c] += mass[p,0]
+
+    @numba.njit(cache=True)
+    def _cic_range(lo,hi,posP,velocityP,mass,F,dt,dt_kick,n0,n1,rho,flat,w):
+        """
+        Same as _ngp_range() with the CIC assignment. The corners are stored in the same 
+        order as deposition.stencil().
+        """
+        for p in range(lo,hi):
+            kick = dt_kick/mass[p,0]
+            vx = velocityP[p,0]+F[p,0]*kick
+            vy = velocityP[p,1]+F[p,1]*kick
+            velocityP[p,0], velocityP[p,1] = vx, vy
+            x = (posP[p,0]+vx*dt) % n0
+            y = (posP[p,1]+vy*dt) % n1
+            posP[p,0], posP[p,1] = x, y
+            #Read back, so float32 positions get the stencil of their rounded value
+            x, y = posP[p,0], posP[p,1]
+
+            bx, by = np.floor(x), np.floor(y)
+            fx, fy = x-bx, y-by
+            i0, j0 = int(bx) % n0, int(by) % n1
+            i1, j1 = (i0+1) % n0, (j0+1) % n1
+            flat[p,0], w[p,0] = i0*n1+j0, (1-fx)*(1-fy)
+            flat[p,1], w[p,1] = i0*n1+j1, (1-fx)*fy
+            flat[p,2], w[p,2] = i1*n1+j0, fx*(1-fy)
+            flat[p,3], w[p,3] = i1*n1+j1, fx*fy
+            for k in range(4):
+                rho[flat[p,k]] += w[p,k]*mass[p,0]
+
+    @numba.njit(cache=True)
+    def _push_serial(cic,posP,velocityP,mass,F,dt,dt_kick,n0,n1,rho,flat,w,nthreads=1):
+        rho[:] = 0
+        if cic:
+            _cic_range(0,posP.shape[0],posP,velocityP,mass,F,dt,dt_kick,n0,n1,rho,flat,w)
+        else:
+            _ngp_range(0,posP.shape[0],posP,velocityP,mass,F,dt,dt_kick,n0,n1,rho,flat,w)
+
+    @numba.njit(parallel=True,cache=True)
+    def _push_parallel(cic,posP,velocityP,mass,F,dt,dt_kick,n0,n1,rho,flat,w,nthreads):
+        #Every thread deposits in its own copy of the grid, which are summed at the end,
+        #so no two threads ever write to the same gridpoint. nthreads is passed in, as
+        #calling numba.get_num_threads() here would keep the kernel from being cached
+        npart = posP.shape[0]
+        chunk = (npart+nthreads-1)//nthreads
+        local = np.zeros((nthreads,rho.shape[0]))
+        for t in numba.prange(nthreads):
+            lo, hi = t*chunk, min(npart,(t+1)*chunk)
+            if cic:
+                _cic_range(lo,hi,posP,velocityP,mass,F,dt,dt_kick,n0,n1,local[t],flat,w)
+            else:
+                _ngp_range(lo,hi,posP,velocityP,mass,F,dt,dt_kick,n0,n1,local[t],flat,w)
+        for c in numba.prange(rho.shape[0]):
+            s = 0.0
+            for t in range(nthreads):
+                s += local[t,c]
+            rho[c] = s
+
+
+def push_deposit(posP,velocityP,mass,F,dt,shape,scheme,rho,flat,w,parallel=False,periodic=True,dt_kick=None):
+    """
+    Fuses the kick, the drift, the periodic wrap and the mass deposition of a step in a
+    single pass over the particles. Every array is updated in place.
+    Input(s):
+        - posP, velocityP (array): (npart, ndim) positions and velocities of the particles
+        - mass (array): (npart, 1) masses of the particles
+        - F (array): (npart, ndim) forces on the particles
+        - dt (float): time step
+        - shape (tuple): shape of the grid
+        - scheme (str): assignment scheme (NGP and CIC are compiled in 2-D)
+        - rho (array): grid receiving the densities
+        - flat, w (array): stencil of the particles, same layout as deposition.stencil()
+        - parallel (bool): use the multi-threaded kernel (per-thread density buffers)
+        - periodic (bool): False for isolated boxes (only done by the numpy version)
+        - dt_kick (float): time step of the velocity update if it differs from dt
+    """
+    if dt_kick is None:
+        dt_kick = dt
+    compiled = (numba is not None and len(shape) == 2 and scheme in ('NGP','CIC')
+                and rho.flags.c_contiguous and periodic)
+    if not compiled:
+        _push_numpy(posP,velocityP,mass,F,dt,dt_kick,shape,scheme,rho,flat,w,periodic)
+        return
+    kernel = _push_parallel if parallel else _push_serial
+    kernel(scheme == 'CIC',posP,velocityP,mass,F,float(dt),float(dt_kick),shape[0],shape[1],
+           rho.reshape(-1),flat,w,numba.get_num_threads() if parallel else 1)
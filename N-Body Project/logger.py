@@ -0,0 +1,65 @@
+import numpy as np
+
+from background import BackgroundWorker
+
+
+class AsyncLogger:
+    def __init__(self,file,flush_every=20,maxqueue=64):
+        """
+        Drop-in replacement for the text files given to NBody.evolve() (file_save and
+        file_save_pos). Lines are handed to a writer thread instead of being written
+        by the simulation, and the file is only flushed every flush_every lines.
+        Arrays given to write_array() are formatted in that thread too.
+        Use it as a context manager (or call close()) so everything reaches the disk.
+        Input(s):
+            - file (str or file): path of the log (opened in 'w' mode) or an opened file
+            - flush_every (int): number of lines between two flushes of the file
+            - maxqueue (int): maximum number of lines waiting to be written, the
+            simulation waits on the disk past that
+        """
+        if isinstance(file,str):
+            self.file = open(file,'w')
+            self.owns_file = True
+        else:
+            self.file = file
+            self.owns_file = False
+        self.flush_every = flush_every
+        self.pending = 0
+        self.worker = BackgroundWorker(maxqueue,name='nbody-log')
+
+    def _write(self,text):
+        self.file.write(text)
+        self.pending += 1
+        if self.pending >= self.flush_every:
+            self.file.flush()
+            self.pending = 0
+
+    def _write_array(self,A):
+        self._write(f"{A}\n")
+
+    def write(self,text):
+        self.worker.submit(self._write,text)
+
+    def write_array(self,A):
+        """
+        Logs an array the same way f"{A}\\n" would, from a copy taken right away
+        """
+        self.worker.submit(self._write_array,np.array(A))
+
+    def flush(self):
+        """
+        Does nothing, the writer thread flushes by batches (see flush_every).
+        Kept so this can be used wherever a file is expected.
+        """
+
+    def close(self):
+        self.worker.close()
+        self.file.flush()
+        if self.owns_file:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*args):
+        self.close()
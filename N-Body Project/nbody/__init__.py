@@ -0,0 +1,9 @@
+"""
+Command line tools to run NBody simulations without a display and to render them
+afterwards. See `python -m nbody --help`.
+"""
+import os
+import sys
+
+#The simulation modules (NBody.py, particle.py, ...) sit in the folder above
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,50 @@
+"""
+python -m nbody run config.yaml [--resume]
+python -m nbody render run_folder --out movie.gif [--kind density] [--processes 4]
+python -m nbody sweep sweep.yaml --out results.csv [--processes 4]
+"""
+import argparse
+
+from nbody import batch, render, sweep
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m nbody',description='Headless NBody runs')
+    sub = parser.add_subparsers(dest='command',required=True)
+
+    p_run = sub.add_parser('run',help='run a simulation and save its snapshots')
+    p_run.add_argument('config',help='YAML or JSON configuration (see nbody/batch.py DEFAULTS)')
+    p_run.add_argument('--output',help='overrides the output folder of the configuration')
+    p_run.add_argument('--quiet',action='store_true')
+    p_run.add_argument('--resume',action='store_true',help='carry on from the checkpoint of the output folder')
+
+    p_render = sub.add_parser('render',help='draw the snapshots of a run')
+    p_render.add_argument('path',help='output folder of a run')
+    p_render.add_argument('--out',help='GIF to create')
+    p_render.add_argument('--kind',choices=['particles','density'],default='particles')
+    p_render.add_argument('--processes',type=int)
+    p_render.add_argument('--fps',type=int,default=10)
+    p_render.add_argument('--log',action='store_true',help='log colour scale for densities')
+
+    p_sweep = sub.add_parser('sweep',help='run every combination of a parameter grid')
+    p_sweep.add_argument('config',help='run configuration with a sweep entry (see nbody/sweep.py)')
+    p_sweep.add_argument('--out',default='sweep.csv',help='CSV table of the results')
+    p_sweep.add_argument('--processes',type=int)
+    p_sweep.add_argument('--quiet',action='store_true')
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        config = batch.load_config(args.config)
+        if args.output:
+            config['output'] = args.output
+        batch.run(config,verbose=not args.quiet,resume=args.resume)
+    elif args.command == 'sweep':
+        configs,swept = sweep.load_sweep(args.config)
+        sweep.sweep(configs,swept,out=args.out,processes=args.processes,verbose=not args.quiet)
+    else:
+        render.render(args.path,out=args.out,kind=args.kind,processes=args.processes,
+                      fps=args.fps,log=args.log)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+import contextlib
+import json
+import os
+import time
+import numpy as np
+
+import particle as P
+import initial_conditions as ic
+import NBody as nb
+import snapshot
+import checkpoint
+import diagnostics
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+#Everything a config file can set. These mirror the parameters of the P1-P4 scripts
+DEFAULTS = {
+    'npart':1,
+    'gridsize':2**9,
+    'size':None,
+    'mass':1.0,
+    'positions':None,
+    'velocities':0,
+    'soft':0.1,
+    'G':1,
+    'dt':1,
+    'boundary_type':'Periodic',
+    'cosmos':False,
+    'zeldovich':None,
+    'scheme':'NGP',
+    'fft_backend':'numpy',
+    'workers':1,
+    'jit':False,
+    'integrator':'euler',
+    'courant':None,
+    'p3m':False,
+    'r_split':1.25,
+    'solver':'pm',
+    'theta':0.5,
+    'gradient':'stencil',
+    'dtype':'float64',
+    'frames':100,
+    'steps_per_frame':1,
+    'track':None,
+    'save_densities':False,
+    'seed':None,
+    'output':'run',
+    'checkpoint_every':None,
+    'checkpoint_compress':False,
+    'profile':False,
+    'diagnostics_every':None,
+    'power_bins':None,
+}
+
+
+def read_file(file):
+    """
+    Reads a YAML (or JSON, by extension) file into a dict
+    """
+    with open(file) as f:
+        if file.endswith('.json'):
+            return json.load(f)
+        elif yaml is None:
+            raise ImportError('pyyaml is needed to read YAML configurations, use JSON instead')
+        else:
+            return yaml.safe_load(f) or {}
+
+
+def fill(user):
+    """
+    Checks the keys of a configuration and fills in the defaults
+    Input(s):
+        - user (dict): keys set by the user
+    Output(s):
+        - config (dict): every key of DEFAULTS
+    """
+    unknown = set(user)-set(DEFAULTS)
+    if unknown:
+        raise ValueError(f'Unknown configuration keys: {sorted(unknown)}')
+    config = dict(DEFAULTS)
+    config.update(user)
+    return config
+
+
+def load_config(file):
+    """
+    Reads a run configuration from a YAML (or JSON) file and fills in the defaults
+    Input(s):
+        - file (str): path of the configuration
+    Output(s):
+        - config (dict): every key of DEFAULTS
+    """
+    return fill(read_file(file))
+
+
+def build(config,ffG=None):
+    """
+    Creates the particles and the NBody simulation described by a configuration
+    (ffG is an optional precomputed green function spectrum, see NBody)
+    """
+    size = tuple(config['size'] or (config['gridsize'],config['gridsize']))
+    npart = config['npart']
+    velocities = config['velocities']
+    if velocities == 'random':
+        velocities = None
+    elif not np.isscalar(velocities):
+        velocities = np.array(velocities,dtype=float)
+    positions = config['positions']
+    if positions is not None:
+        positions = np.array(positions,dtype=float)
+
+    zeldovich = config['zeldovich']
+    if zeldovich is not None:
+        #Lattice displaced from a Gaussian random field, npart is set by the stride
+        zeldovich = dict(zeldovich)
+        power = ic.power_law(zeldovich.pop('power_index',-3),zeldovich.pop('amplitude',1.0))
+        s = ic.cosmos_init(size,config['mass'],power=power,seed=config['seed'],**zeldovich)
+    else:
+        s = P.system_init(npart,size,config['mass'],npart_specific=positions,
+                          npart_specificVel=velocities,boundary_type=config['boundary_type'],
+                          soft=config['soft'],cosmos=config['cosmos'],seed=config['seed'])
+    return nb.NBody(size,s,config['dt'],soft=config['soft'],G=config['G'],
+                    boundary_type=config['boundary_type'],fft_backend=config['fft_backend'],
+                    workers=config['workers'],scheme=config['scheme'],jit=config['jit'],
+                    integrator=config['integrator'],courant=config['courant'],p3m=config['p3m'],
+                    r_split=config['r_split'],solver=config['solver'],theta=config['theta'],
+                    gradient=config['gradient'],dtype=config['dtype'],ffG=ffG)
+
+
+def run(config,verbose=True,resume=False):
+    """
+    Runs a simulation without any display: evolves it frames times by steps_per_frame 
+    steps and appends a snapshot to the output folder after each frame. The configuration 
+    is saved along (run.json) so the folder can be rendered later on. With checkpoint_every,
+    the whole state is saved to checkpoint.npz in that folder every so many steps. With
+    profile (True, or 'memory' to count the allocations too), the time spent in each
+    phase of the steps is written to profile.json at the end (see profiler.py). With
+    diagnostics_every, the power spectrum and the statistics of the densities are measured
+    every so many steps and appended to the diagnostics subfolder (see diagnostics.py).
+    Input(s):
+        - config (dict): output of load_config()
+        - verbose (bool): print the progress
+        - resume (bool): carry on from the checkpoint of the output folder (if there is 
+        one); the snapshots taken after it are dropped and done again
+    Output(s):
+        - g (NBody): the simulation in its final state
+    """
+    out = config['output']
+    os.makedirs(out,exist_ok=True)
+    with open(os.path.join(out,'run.json'),'w') as f:
+        json.dump(config,f,indent=1)
+
+    file = os.path.join(out,'checkpoint.npz')
+    if resume and os.path.exists(file):
+        g = nb.NBody.from_checkpoint(file)
+        snapshot.truncate(out,g.step)
+        snapshot.truncate(os.path.join(out,'diagnostics'),g.step)
+        if verbose:
+            print(f"resuming from step {g.step}",flush=True)
+    else:
+        g = build(config)
+    if config['profile']:
+        g.profile(memory=config['profile'] == 'memory')
+    spf = config['steps_per_frame']
+    st = time.time()
+    with contextlib.ExitStack() as stack:
+        snaps = stack.enter_context(snapshot.SnapshotWriter(out,track=config['track']))
+        ckpt = stack.enter_context(checkpoint.CheckpointWriter(file,every=config['checkpoint_every'],
+                                                               compress=config['checkpoint_compress']))
+        stats = None
+        if config['diagnostics_every']:
+            writer = stack.enter_context(snapshot.SnapshotWriter(os.path.join(out,'diagnostics')))
+            stats = diagnostics.Diagnostics(every=config['diagnostics_every'],writer=writer,
+                                            nbins=config['power_bins'])
+        for i in range(g.step//spf,config['frames']):
+            #A checkpoint can fall in the middle of a frame
+            energy,_ = g.evolve(nsteps=(i+1)*spf-g.step,checkpoint=ckpt,diagnostics=stats)
+            extra = {'densities':g.densities} if config['save_densities'] else {}
+            snaps.write(g.step,g.posP,g.velocityP,energy=energy,time=g.time,**extra)
+            if verbose:
+                print(f"frame {i+1}/{config['frames']}, step {g.step}, energy {energy:.6e}, "
+                      f"{time.time()-st:.1f}s",flush=True)
+    if config['profile']:
+        g.profiler.dump(os.path.join(out,'profile.json'),step=g.step)
+        if verbose:
+            print(g.profiler.summary(),flush=True)
+    return g
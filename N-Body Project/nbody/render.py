@@ -0,0 +1,76 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+import snapshot
+
+
+def _render_frame(path,i,kind,png,log):
+    """
+    Draws the snapshot i of a run folder in png. Runs in the worker processes.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from matplotlib.colors import LogNorm
+
+    with open(os.path.join(path,'run.json')) as f:
+        config = json.load(f)
+    size = config['size'] or (config['gridsize'],config['gridsize'])
+    snaps = snapshot.load(path,fields=['pos','densities','step'])
+
+    labelsize = 15
+    fig = plt.figure(figsize=(10,6))
+    ax = fig.add_subplot(111, autoscale_on=False, xlim = (0,size[0]),ylim=(0,size[1]))
+    ax.tick_params(labelsize=labelsize)
+    ax.set_xlabel("X Position",fontsize=labelsize)
+    ax.set_ylabel("Y Position",fontsize = labelsize)
+    ax.set_title(f"Step {int(snaps['step'][i])}",fontsize=labelsize)
+    if kind == 'density':
+        rho = np.array(snaps['densities'][i])
+        if log:
+            floor = rho[rho>0].min()*1e-3 if np.any(rho>0) else 1e-3
+            im = ax.imshow(np.maximum(rho,floor),origin='lower',cmap='inferno',norm=LogNorm())
+        else:
+            im = ax.imshow(rho,origin='lower',cmap='inferno')
+        plt.colorbar(im)
+    else:
+        pos = snaps['pos'][i]
+        ax.plot(pos[:,0],pos[:,1],'*',markersize=10,color='black')
+    fig.savefig(png)
+    plt.close(fig)
+    return png
+
+
+def render(path,out=None,kind='particles',processes=None,fps=10,log=False):
+    """
+    Renders the snapshots of a run folder (written by batch.run()) to PNG frames, in 
+    parallel over a process pool, then puts them together in a GIF.
+    Input(s):
+        - path (str): run folder
+        - out (str): name of the GIF (no GIF if None, only the frames in path/frames)
+        - kind (str): 'particles' to plot the positions, 'density' to show the densities 
+        (needs save_densities in the configuration)
+        - processes (int): number of processes drawing the frames (all the cores if None)
+        - fps (int): frames per second of the GIF
+        - log (bool): logarithmic colour scale for the densities
+    Output(s):
+        - frames (list): paths of the PNG frames
+    """
+    snaps = snapshot.load(path,fields=['step','densities'])
+    if kind == 'density' and 'densities' not in snaps:
+        raise ValueError('This run did not save its densities (save_densities: true)')
+    nframes = len(snaps['step'])
+    folder = os.path.join(path,'frames')
+    os.makedirs(folder,exist_ok=True)
+    pngs = [os.path.join(folder,f'frame_{i:05d}.png') for i in range(nframes)]
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        frames = list(pool.map(_render_frame,[path]*nframes,range(nframes),[kind]*nframes,
+                               pngs,[log]*nframes))
+
+    if out is not None:
+        from PIL import Image
+        images = [Image.open(f) for f in frames]
+        images[0].save(out,save_all=True,append_images=images[1:],duration=int(1000/fps),loop=0)
+    return frames
@@ -0,0 +1,143 @@
+import csv
+import itertools
+import os
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+from nbody import batch
+
+
+def load_sweep(file):
+    """
+    Reads a sweep configuration: the keys of a run configuration (see batch.DEFAULTS),
+    shared by every run, plus a 'sweep' entry giving a list of values for some of
+    them. Every combination of those values is run.
+    Input(s):
+        - file (str): YAML or JSON file
+    Output(s):
+        - configs (list): one full configuration per run
+        - swept (list): names of the keys that vary
+    """
+    user = batch.read_file(file)
+    grid = user.pop('sweep',None) or {}
+    base = batch.fill(user)
+    unknown = set(grid)-set(batch.DEFAULTS)
+    if unknown:
+        raise ValueError(f'Unknown sweep keys: {sorted(unknown)}')
+    swept = list(grid)
+    configs = []
+    for values in itertools.product(*[grid[k] for k in swept]):
+        config = dict(base)
+        config.update(zip(swept,values))
+        configs.append(config)
+    return configs,swept
+
+
+def _kernel_key(config):
+    """
+    What the green function spectrum of a run depends on (see NBody.kernel_spectrum())
+    """
+    size = tuple(config['size'] or (config['gridsize'],config['gridsize']))
+    return (size,config['soft'],config['boundary_type'],config['fft_backend'],
+            bool(config['p3m']),config['r_split'],config['dtype'])
+
+
+def _attach(name,shape,dtype):
+    """
+    Read-only view of a spectrum shared by the parent process
+    """
+    #The pool workers share the resource tracker of the parent, which frees the block
+    shm = shared_memory.SharedMemory(name=name)
+    ffG = np.ndarray(shape,dtype=dtype,buffer=shm.buf)
+    ffG.flags.writeable = False
+    return shm,ffG
+
+
+def run_one(config,kernel=None):
+    """
+    Runs one configuration of a sweep and measures how well it conserves the energy.
+    Nothing is saved to the disk.
+    Input(s):
+        - config (dict): full run configuration
+        - kernel (tuple): (name, shape, dtype) of the shared green function spectrum
+    Output(s):
+        - metrics (dict): initial and final energy, largest and final relative change of
+        the energy (sampled after every frame), number of force evaluations and wall time
+    """
+    shm = None
+    ffG = None
+    if kernel is not None:
+        shm,ffG = _attach(*kernel)
+    try:
+        st = time.perf_counter()
+        g = batch.build(config,ffG=ffG)
+        E0 = g.totalEnergy()
+        drift = []
+        for i in range(config['frames']):
+            energy,_ = g.evolve(nsteps=config['steps_per_frame'])
+            drift.append(energy/E0-1)
+        drift = np.abs(drift)
+        return {'E0':E0,'E_final':energy,'max_drift':np.max(drift),'final_drift':drift[-1],
+                'rms_drift':np.sqrt(np.mean(drift**2)),'forces':g.nforces,'steps':g.step,
+                'seconds':time.perf_counter()-st}
+    finally:
+        #The arrays of g may still point to the block, they are dropped with g
+        g = ffG = None
+        if shm is not None:
+            shm.close()
+
+
+def sweep(configs,swept,out=None,processes=None,verbose=True):
+    """
+    Runs a list of configurations over a pool of processes. The green function spectrum
+    of every distinct grid/softening/boundary combination is computed once here and
+    put in shared memory, so the workers neither recompute nor copy it.
+    Input(s):
+        - configs (list): full run configurations (see load_sweep())
+        - swept (list): keys that vary between them, written in the table
+        - out (str): CSV file receiving the table of results (not written if None)
+        - processes (int): number of worker processes (all the cores if None)
+        - verbose (bool): print each run as it finishes
+    Output(s):
+        - rows (list): one dict per run with the swept keys and the metrics of run_one()
+    """
+    blocks = {}
+    kernels = []
+    try:
+        for config in configs:
+            key = _kernel_key(config)
+            if key not in blocks and config['solver'] == 'pm':
+                #A run without particles has the same spectrum and costs nothing to set up
+                ffG = batch.build(dict(config,npart=0,positions=None,zeldovich=None,
+                                       cosmos=False,velocities=0)).kernel_spectrum()
+                shm = shared_memory.SharedMemory(create=True,size=ffG.nbytes)
+                np.ndarray(ffG.shape,dtype=ffG.dtype,buffer=shm.buf)[...] = ffG
+                blocks[key] = (shm,(shm.name,ffG.shape,ffG.dtype.str))
+            kernels.append(blocks[key][1] if key in blocks else None)
+
+        rows = [None]*len(configs)
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = {pool.submit(run_one,c,k):i for i,(c,k) in enumerate(zip(configs,kernels))}
+            for n,future in enumerate(as_completed(futures)):
+                i = futures[future]
+                row = {k:configs[i][k] for k in swept}
+                row.update(future.result())
+                rows[i] = row
+                if verbose:
+                    params = ', '.join(f'{k}={row[k]}' for k in swept)
+                    print(f"[{n+1}/{len(configs)}] {params}: max drift {row['max_drift']:.3e}, "
+                          f"{row['seconds']:.1f}s",flush=True)
+    finally:
+        for shm,_ in blocks.values():
+            shm.close()
+            shm.unlink()
+
+    if out is not None:
+        os.makedirs(os.path.dirname(os.path.abspath(out)),exist_ok=True)
+        with open(out,'w',newline='') as f:
+            writer = csv.DictWriter(f,fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+    return rows
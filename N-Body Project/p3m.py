@@ -0,0 +1,160 @@
+import itertools
+import numpy as np
+from math import erf, sqrt, pi
+
+try:
+    from scipy.spatial import cKDTree
+    from scipy.special import erf as _erf, erfc as _erfc
+except ImportError:
+    cKDTree = None
+    _erf = np.vectorize(erf)
+    _erfc = np.vectorize(lambda x: 1-erf(x))
+
+
+#Beyond this many r_split the short-range force is below 0.2% of the full one
+CUTOFF = 4.5
+
+
+def long_range(r,r_split):
+    """
+    Fraction of the green function solved on the mesh, erf(r/(2*r_split)). It goes
+    to 0 at small distances, so the mesh only sees a smooth potential, and to 1 beyond
+    a few r_split, where the mesh is accurate.
+    Input(s):
+        - r (array): distance (in cells)
+        - r_split (float): splitting scale (in cells)
+    """
+    return _erf(r/(2*r_split))
+
+
+def _soft_radius(r2,soft):
+    #Same softening as NBody.green()
+    return np.sqrt(np.maximum(r2,soft**2)+soft**2)
+
+
+def find_pairs(posP,size,r_cut,periodic=True,method='auto'):
+    """
+    Finds every pair of particles closer than r_cut.
+    Input(s):
+        - posP (array): (npart, ndim) positions of the particles
+        - size (tuple): size of the grid
+        - r_cut (float): largest separation kept
+        - periodic (bool): use the minimum image of the periodic box
+        - method (str): kdtree (scipy.spatial.cKDTree), cells (cell-linked list in numpy)
+        or auto (kdtree if scipy is installed)
+    Output(s):
+        - i, j (array): indices of the two particles of each pair (i < j)
+        - d (array): (npairs, ndim) separations posP[i]-posP[j] (minimum image if periodic)
+    """
+    if method == 'auto':
+        method = 'kdtree' if cKDTree is not None else 'cells'
+    box = np.asarray(size,dtype=float)
+    if method == 'kdtree':
+        if periodic:
+            pos = posP % box
+            #The rounding of % can give exactly the size, which cKDTree refuses
+            pos[pos>=box] = 0.
+            tree = cKDTree(pos,boxsize=box)
+        else:
+            tree = cKDTree(posP)
+        pairs = tree.query_pairs(r_cut,output_type='ndarray')
+        i,j = pairs[:,0],pairs[:,1]
+    elif method == 'cells':
+        i,j = _cell_pairs(posP,box,r_cut,periodic)
+    else:
+        raise ValueError(f'Unknown method {method}, use kdtree, cells or auto')
+
+    d = posP[i]-posP[j]
+    if periodic:
+        d -= box*np.round(d/box)
+    keep = np.sum(d**2,axis=1) < r_cut**2
+    return i[keep],j[keep],d[keep]
+
+
+def _cell_pairs(posP,box,r_cut,periodic):
+    """
+    Candidate pairs of a cell-linked list: the particles are sorted by cells of side
+    at least r_cut, and each particle is paired with every particle of its own and
+    neighbouring cells, one neighbour offset at a time (3**ndim numpy passes).
+    """
+    npart,ndim = posP.shape
+    if periodic:
+        ncell = np.maximum(1,(box//r_cut).astype(int))
+        side = box/ncell
+        cells = np.floor((posP % box)/side).astype(int) % ncell
+    else:
+        lo = posP.min(axis=0)
+        ncell = np.floor((posP.max(axis=0)-lo)/r_cut).astype(int)+1
+        cells = np.floor((posP-lo)/r_cut).astype(int)
+    key = np.ravel_multi_index(tuple(cells.T),tuple(ncell))
+    order = np.argsort(key,kind='stable')
+    start = np.searchsorted(key[order],np.arange(np.prod(ncell)+1))
+
+    #With less than 3 cells along an axis, -1 and +1 are the same neighbour
+    offsets = [sorted({o % n for o in (-1,0,1)}) if periodic else (-1,0,1) for n in ncell]
+    I, J = [], []
+    for off in itertools.product(*offsets):
+        nb = cells+np.asarray(off)
+        if periodic:
+            nb %= ncell
+            valid = np.arange(npart)
+        else:
+            valid = np.nonzero(np.all((nb>=0)&(nb<ncell),axis=1))[0]
+            nb = nb[valid]
+        nkey = np.ravel_multi_index(tuple(nb.T),tuple(ncell))
+        counts = start[nkey+1]-start[nkey]
+        i = np.repeat(valid,counts)
+        #Position of each candidate within its cell, then in the sorted particles
+        first = np.repeat(start[nkey],counts)
+        within = np.arange(len(i))-np.repeat(np.cumsum(counts)-counts,counts)
+        j = order[first+within]
+        keep = i < j
+        I.append(i[keep])
+        J.append(j[keep])
+    return np.concatenate(I),np.concatenate(J)
+
+
+def short_range(posP,mass,size,soft,r_split,G=1,periodic=True,r_cut=None,method='auto',energy=False):
+    """
+    Short-range part of the forces, the complement of what the mesh solves: every
+    pair closer than r_cut interacts through the green function of NBody.green()
+    times erfc(r/(2*r_split)). Fully vectorized over the pairs.
+    Input(s):
+        - posP (array): (npart, ndim) positions of the particles
+        - mass (array): (npart, 1) masses of the particles
+        - size (tuple): size of the grid
+        - soft (float): softener of the green function
+        - r_split (float): splitting scale (in cells)
+        - G (float): gravitational constant
+        - periodic (bool): use the minimum image of the periodic box
+        - r_cut (float): largest separation considered (CUTOFF*r_split if None)
+        - method (str): how the pairs are found, see find_pairs()
+        - energy (bool): also return the short-range potential energy
+    Output(s):
+        - F (array): (npart, ndim) short-range forces on the particles
+        - U (float): short-range potential energy (only if energy is True)
+    """
+    if r_cut is None:
+        r_cut = CUTOFF*r_split
+    npart,ndim = posP.shape
+    i,j,d = find_pairs(posP,size,r_cut,periodic,method)
+    r2 = np.sum(d**2,axis=1)
+    r = np.sqrt(r2)
+    R = _soft_radius(r2,soft)
+    mm = G*mass[i,0]*mass[j,0]
+
+    #phi = erfc(r/2rs)/(4 pi R), and the pair attracts along -d with a strength -dphi/dr.
+    #R does not depend on r inside the softening length (see green())
+    phi = _erfc(r/(2*r_split))/(4*pi*R)
+    dR = np.where(r2>soft**2,r/R,0.)
+    dphi = -np.exp(-r2/(4*r_split**2))/(4*pi*R*r_split*sqrt(pi))-phi*dR/R
+    with np.errstate(divide='ignore',invalid='ignore'):
+        f = np.where(r>0,mm*dphi/r,0.)
+
+    F = np.empty((npart,ndim))
+    for a in range(ndim):
+        fa = f*d[:,a]
+        F[:,a] = np.bincount(i,fa,minlength=npart)-np.bincount(j,fa,minlength=npart)
+    if energy:
+        return F,-np.sum(mm*phi)
+    return F
@@ -1,7 +1,6 @@
-import random as rn
 import numpy as np
-import matplotlib.pyplot as plt
 
+BOUNDARY_TYPES = ('Periodic','Non-Periodic')
 
 
 class particle: 
@@ -17,111 +16,113 @@ class particle:
         self.position = (x,y)
         self.velocity = (vx,vy)
 
-class system_init: 
-    def __init__(self,npart,size,init_mass,npart_specific=None,npart_specificVel=None,boundary_type='Periodic',soft=None,cosmos=False):
+class system_init:
+    def __init__(self,npart,size,init_mass,npart_specific=None,npart_specificVel=None,boundary_type='Periodic',soft=None,cosmos=False,seed=None,dtype=np.float64):
         """
-        Defines the total system of particles and puts them in a list. 
-        Inputs: 
-            - npast (int): total number of particles 
-            - size (int): (x,y) of the size of the grid 
-            - init_mass (array): initial mass of the particles
+        Defines the total system of particles. The positions, velocities and masses are
+        generated directly as numpy arrays (one row per particle); the particle objects
+        are only built if self.particles is used.
+        Inputs:
+            - npast (int): total number of particles
+            - size (int): (x,y) of the size of the grid. Any number of dimensions works
+            - init_mass (array or float): initial mass of the particles (a float gives
+            the same mass to all of them)
             - npart_specific (array): inital position of the particles (specified)
             - npart_specificVel (array): inital velocity of the particles (specified)
-            If the last two are not specified, then they are generated below via the two 
+            If the last two are not specified, then they are generated below via the two
             functions
+            - seed (int): seed of the random generator (numpy.random.Generator), so a
+            system can be generated again exactly
+            - dtype: float type of the positions, velocities and masses (e.g. np.float32
+            to halve the memory of big systems)
         """
+        if boundary_type not in BOUNDARY_TYPES:
+            raise ValueError(f'Unknown boundary type {boundary_type}, choose from {BOUNDARY_TYPES}')
         self.boundary_type = boundary_type
-        def initial_pos(size,npart,npart_specific=None): 
+        self.cosmos = cosmos
+        self.rng = np.random.default_rng(seed)
+        self.dtype = dtype
+        ndim = len(size)
+        sides = np.asarray(size,dtype=float)
+
+        def initial_pos(size,npart,npart_specific=None):
             """
-            Depending on the grid size, generates random position on the grid. 
+            Depending on the grid size, generates random position on the grid.
             Inputs:
                 - size (array): size of grid. In the format of (x,y)
                 - npart (int): total number of particles of the system
                 - npar_specific (array): specific boundary condition pre-defined by the user
             """
-            self.cosmos = cosmos
-            if self.boundary_type == 'Periodic':
-                init_cond = []
-                if npart_specific is None: 
-                    l = 0
-                else: 
-                    l = len(npart_specific)
-                    for k in range(l):
-                        pos = (npart_specific[k][0], npart_specific[k][1])
-                        init_cond.append(pos)
+            init_cond = np.empty((npart,ndim),dtype=dtype)
+            l = 0 if npart_specific is None else len(npart_specific)
+            if l > 0:
+                specific = np.asarray(npart_specific,dtype=float)
+                if self.boundary_type == 'Non-Periodic':
+                    if np.any(specific>sides-1) or np.any(specific<1):
+                        raise ValueError(f'The position of the Particle must be within the boundary of 1 to {size[0]-1}')
+                init_cond[:l] = specific
 
-                for p in range(npart-l):
-                    pos = (rn.random())*(size[0]-1), (rn.random())*(size[1]-1)
-                    init_cond.append(pos)
+            if self.boundary_type == 'Periodic':
+                init_cond[l:] = self.rng.random((npart-l,ndim))*(sides-1)
             elif self.boundary_type == 'Non-Periodic':
-                xmin,xmax = 1,size[0]-1
-                init_cond = []
-                if npart_specific is None: 
-                    l = 0
-                else: 
-                    l = len(npart_specific)
-                    for k in range(l):
-                        if npart_specific[k][0].max()>xmax or npart_specific[k][1].max()>xmax or npart_specific[k][0].min()<xmin or npart_specific[k][1]<xmin: 
-                            raise ValueError(f'The position of the Particle must be within the boundary of 1 to {size[0]-1}')
-                        
-                        pos = (npart_specific[k][0], npart_specific[k][1])
-                        init_cond.append(pos)
-                for p in range(npart-l):
-                    pos = rn.uniform(1.0001,size[0]-1.0001), rn.uniform(1.0001,size[1]-1.0001)
-                    init_cond.append(pos)
+                init_cond[l:] = self.rng.uniform(1.0001,sides-1.0001,(npart-l,ndim))
             return init_cond
-        
+
         def initial_vel(size,npart,maxSpeed,npart_specific=None):
             """
             If the velocities are not specified (using npart_specific), this function will
-            generate random velocity according to a Gaussian with a std of 1. 
-            If npart_specific is given to be 0, all the particles will have an inital velocity of 0 
+            generate random velocity according to a Gaussian with a std of 1.
+            If npart_specific is given to be 0, all the particles will have an inital velocity of 0
             Input(s):
-                - size (x,y): size of the grid 
-                - npart (int): the number of particles 
+                - size (x,y): size of the grid
+                - npart (int): the number of particles
                 - maxSpeed (float): Maximum intial speed of the particles
                 - npart_specific (array): Specified inital conditions of the particles
             """
-            init_cond = []
-            
-            if np.isscalar(npart_specific)==False:
-                if npart_specific is None: 
-                    l = 0
-                else: 
-                    l = len(npart_specific[0])
-                    for k in range(l):
-                        vel = (npart_specific[k][0], npart_specific[k][1])
-                        init_cond.append(vel)
-            
-                for p in range(npart-l):
-                    vel = (np.random.normal()*maxSpeed, np.random.normal()*maxSpeed)
-                    init_cond.append(vel)
-            else: 
-                for p in range(npart):
-                    vel = (0,0)
-                    init_cond.append(vel)
+            if np.isscalar(npart_specific):
+                return np.zeros((npart,ndim),dtype=dtype)
+
+            init_cond = np.empty((npart,ndim),dtype=dtype)
+            l = 0 if npart_specific is None else len(npart_specific)
+            if l > 0:
+                init_cond[:l] = np.asarray(npart_specific,dtype=float)
+            init_cond[l:] = self.rng.standard_normal((npart-l,ndim))*maxSpeed
             return init_cond
-        
+
         def initial_mass(size,init_mass,posP=None,soft=None):
+            m = np.broadcast_to(np.asarray(init_mass,dtype=float),(npart,))
             if self.cosmos == False:
-                return np.array([init_mass.copy()]).T
-            else: 
+                return m.astype(dtype).reshape(-1,1)
+            else:
                 posP = np.rint(posP).astype('int') % size[0]
-                
+
                 #To find the power spectrum
-                k_x = np.real(np.fft.fft(posP[:,0]))
-                k_y = np.real(np.fft.fft(posP[:,1]))
-                k_total = np.sqrt(k_x**2+k_y**2)
+                k_total = np.zeros(npart)
+                for i in range(ndim):
+                    k_total += np.real(np.fft.fft(posP[:,i]))**2
+                k_total = np.sqrt(k_total)
                 k_total[k_total<soft] = soft
-                m = init_mass/k_total**3
-                
-                return np.array([m.copy()]).T
+                m = m/k_total**3
+
+                return m.astype(dtype).reshape(-1,1)
 
 
         self.nparticles = npart
-        init_cond = initial_pos(size,npart,npart_specific=npart_specific)
-        init_vel = initial_vel(size,npart,1,npart_specific=npart_specificVel)
-        self.particles = np.asarray([particle(m,x[0],x[1],vx=v[0],vy=v[1]) for m,x,v in zip(init_mass,init_cond,init_vel)])   
-        self.velocities = np.asarray([self.particles[i].velocity for i in range(npart)])
-        self.pos = np.asarray([self.particles[i].position for i in range(npart)])
-        self.masses = initial_mass(size,init_mass,posP=self.pos,soft=soft)
\ No newline at end of file
+        self.pos = initial_pos(size,npart,npart_specific=npart_specific)
+        self.velocities = initial_vel(size,npart,1,npart_specific=npart_specificVel)
+        self.masses = initial_mass(size,init_mass,posP=self.pos,soft=soft)
+        self._particles = None
+
+    @property
+    def particles(self):
+        """
+        Array of particle objects, built the first time it is used
+        """
+        if self._particles is None:
+            parts = []
+            for m,x,v in zip(self.masses[:,0],self.pos,self.velocities):
+                p = particle(m,x[0],x[1],vx=v[0],vy=v[1])
+                p.position, p.velocity = tuple(x), tuple(v)
+                parts.append(p)
+            self._particles = np.asarray(parts)
+        return self._particles
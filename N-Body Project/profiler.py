@@ -0,0 +1,148 @@
+import functools
+import json
+import os
+import time
+import tracemalloc
+
+#Methods of NBody timed by the profiler, one phase each. The phases nest (e.g. push
+#calls density_assignment), so each one has its total time and its own time without
+#the phases it called. The FFTs of the backend are timed as rfftn and irfftn.
+PHASES = ['evolve','push','kick','density_assignment','kernel_spectrum','pot','field_mesh',
+          'forces_mesh','forces_pctls','short_range','totalEnergy']
+
+
+class Profiler:
+    def __init__(self,memory=False):
+        """
+        Collects the time (and optionally the memory) spent in each phase of the steps
+        of a simulation, over all the calls. See NBody.profile(), which attaches one.
+        Nothing is instrumented until attach() is called, and detach() removes it all,
+        so a run that is not profiled does not pay anything.
+        Input(s):
+            - memory (bool): also trace the allocations of each phase with tracemalloc
+            (net bytes left allocated and peak bytes above the start of the phase). This
+            slows the run down noticeably
+        """
+        self.memory = memory
+        self.stats = {}
+        self.stack = []
+        self.targets = []
+        self.tracing = False
+
+    def _timed(self,name,fun):
+        @functools.wraps(fun)
+        def wrapper(*args,**kwargs):
+            self._enter()
+            try:
+                return fun(*args,**kwargs)
+            finally:
+                self._exit(name)
+        return wrapper
+
+    def _enter(self):
+        frame = {'start':time.perf_counter(),'children':0.}
+        if self.memory:
+            current,peak = tracemalloc.get_traced_memory()
+            if self.stack:
+                self.stack[-1]['peak'] = max(self.stack[-1]['peak'],peak)
+            tracemalloc.reset_peak()
+            frame['memory'] = frame['peak'] = current
+        self.stack.append(frame)
+
+    def _exit(self,name):
+        frame = self.stack.pop()
+        elapsed = time.perf_counter()-frame['start']
+        s = self.stats.get(name)
+        if s is None:
+            s = self.stats[name] = {'calls':0,'seconds':0.,'self':0.}
+        s['calls'] += 1
+        s['seconds'] += elapsed
+        s['self'] += elapsed-frame['children']
+        if self.memory:
+            current,peak = tracemalloc.get_traced_memory()
+            frame['peak'] = max(frame['peak'],peak)
+            s['allocated'] = s.get('allocated',0)+current-frame['memory']
+            s['peak'] = max(s.get('peak',0),frame['peak']-frame['memory'])
+            tracemalloc.reset_peak()
+        if self.stack:
+            self.stack[-1]['children'] += elapsed
+            if self.memory:
+                self.stack[-1]['peak'] = max(self.stack[-1]['peak'],frame['peak'])
+
+    def _wrap(self,obj,names):
+        for name in names:
+            setattr(obj,name,self._timed(name,getattr(obj,name)))
+        self.targets.append((obj,names))
+
+    def attach(self,g):
+        """
+        Times the phases of g (and the FFTs of its backend) from now on. The methods
+        are wrapped on the instance only, other simulations are not affected.
+        """
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.tracing = True
+        self._wrap(g,[name for name in PHASES if hasattr(g,name)])
+        #The backend is rebuilt along with the spectrum, its new one is wrapped then
+        spectrum = g.kernel_spectrum
+        def wrap_fft():
+            if hasattr(g,'fft') and not getattr(g.fft,'_profiled',False):
+                self._wrap(g.fft,['rfftn','irfftn'])
+                g.fft._profiled = True
+        @functools.wraps(spectrum)
+        def kernel_spectrum():
+            ffG = spectrum()
+            wrap_fft()
+            return ffG
+        g.kernel_spectrum = kernel_spectrum
+        wrap_fft()
+
+    def detach(self):
+        """
+        Removes every wrapper, the stats are kept
+        """
+        for obj,names in self.targets:
+            for name in names:
+                obj.__dict__.pop(name,None)
+            obj.__dict__.pop('kernel_spectrum',None)
+            obj.__dict__.pop('_profiled',None)
+        self.targets = []
+        if self.tracing:
+            tracemalloc.stop()
+            self.tracing = False
+
+    def reset(self):
+        self.stats = {}
+
+    def as_dict(self):
+        """
+        Output(s):
+            - stats (dict): for each phase, the number of calls, the total time spent in
+            it (seconds), the time without the phases it called (self), the mean time
+            per call and, with memory, the bytes it left allocated and its largest peak
+        """
+        out = {}
+        for name,s in self.stats.items():
+            out[name] = dict(s,mean=s['seconds']/s['calls'])
+        return out
+
+    def dump(self,file,**extra):
+        """
+        Writes as_dict() to a JSON file, along with any extra entries (e.g. step=g.step)
+        """
+        folder = os.path.dirname(os.path.abspath(file))
+        os.makedirs(folder,exist_ok=True)
+        with open(file,'w') as f:
+            json.dump(dict(extra,phases=self.as_dict()),f,indent=1)
+
+    def summary(self):
+        """
+        Table of the phases sorted by their own time
+        """
+        stats = sorted(self.as_dict().items(),key=lambda item: -item[1]['self'])
+        total = sum(s['self'] for _,s in stats) or 1.
+        lines = [f"{'phase':>18} {'calls':>7} {'total [s]':>10} {'self [s]':>9} {'self %':>7} {'mean [ms]':>10}"]
+        for name,s in stats:
+            lines.append(f"{name:>18} {s['calls']:>7} {s['seconds']:>10.4f} {s['self']:>9.4f} "
+                         f"{100*s['self']/total:>7.1f} {1e3*s['mean']:>10.3f}")
+        return '\n'.join(lines)
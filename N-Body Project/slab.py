@@ -0,0 +1,383 @@
+"""
+Slab-decomposed particle mesh: the grid is cut along its first axis into one slab of
+rows per worker. Each worker deposits the particles falling in its rows (plus up to
+two ghost rows on each side, which are then added to the neighbouring slabs) and does
+its share of the FFTs: the transforms along the other axes on its rows, then, after
+a transpose, the transform along the first axis on its block of columns, where the
+green function spectrum is applied.
+Two ways of running the workers:
+    - SlabPM: worker processes on one machine, talking through shared memory. This is
+    what NBody(...,slabs=P) uses.
+    - MPISlabPM: one slab per MPI rank (needs mpi4py), e.g. mpirun -n 4 python slab.py
+Running this file compares both with the serial NBody.pot().
+"""
+import weakref
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+
+import deposition as dp
+import initial_conditions as ic
+
+try:
+    from mpi4py import MPI
+except ImportError:
+    MPI = None
+
+#Ghost rows on each side of a slab (TSC reaches from floor(x)-1 to floor(x)+2)
+GHOST = 2
+
+
+def bounds(n,parts):
+    """
+    First row of each of parts slabs of n rows (and n at the end)
+    """
+    return np.linspace(0,n,parts+1).astype(int)
+
+
+def _owner_rows(posP,size,periodic):
+    """
+    Row that decides which slab a particle belongs to
+    """
+    row = np.floor(posP[:,0]).astype(np.int64)
+    if periodic:
+        return row % size[0]
+    return np.clip(row,0,size[0]-1)
+
+
+def _deposit_rows(posP,mass,size,scheme,periodic,lo,hi):
+    """
+    Deposits the particles owned by the rows lo to hi on those rows plus GHOST rows on
+    each side.
+    Output(s):
+        - L (array): (hi-lo+2*GHOST, *size[1:]) masses, row j is the global row lo-GHOST+j
+        (modulo size[0] if periodic)
+    """
+    row = _owner_rows(posP,size,periodic)
+    mine = (row >= lo) & (row < hi)
+    flat,w = dp.stencil(posP[mine],size,scheme,periodic)
+    stride = int(np.prod(size[1:]))
+    local = flat//stride-(lo-GHOST)
+    if periodic:
+        local %= size[0]
+    nrows = hi-lo+2*GHOST
+    L = np.bincount((local*stride+flat % stride).ravel(),(w*np.reshape(mass,(-1,1))[mine]).ravel(),
+                    minlength=nrows*stride)
+    return L.reshape((nrows,)+tuple(size[1:]))
+
+
+def _ghost_rows(lo,hi,n,periodic):
+    """
+    Global rows of the ghost rows of a slab (-1 where there is no such row)
+    """
+    rows = np.concatenate([np.arange(lo-GHOST,lo),np.arange(hi,hi+GHOST)])
+    if periodic:
+        return rows % n
+    return np.where((rows >= 0) & (rows < n),rows,-1)
+
+
+def _forward(rows,fft_shape):
+    """
+    Transforms of a block of rows along every axis but the first (zero-padded to fft_shape)
+    """
+    axes = tuple(range(1,len(fft_shape)))
+    return np.fft.rfftn(rows,s=fft_shape[1:],axes=axes)
+
+
+def _backward(rows,fft_shape):
+    axes = tuple(range(1,len(fft_shape)))
+    return np.fft.irfftn(rows,s=fft_shape[1:],axes=axes)
+
+
+def _kernel_block(ffG,fft_shape,lo,hi):
+    """
+    Columns lo to hi (second axis) of the green function spectrum, times the shift and
+    average of NBody.pot() written in Fourier space
+    """
+    K = ffG[:,lo:hi].copy()
+    for i,ki in enumerate(ic.wavenumbers(fft_shape)):
+        if i == 1:
+            ki = ki[:,lo:hi]
+        K *= 0.5*(1+np.exp(-1j*ki))
+    return K
+
+
+def _convolve(X,K):
+    """
+    Transform along the first axis of a block of columns, product with the kernel and
+    transform back
+    """
+    X = np.fft.fft(X,axis=0)
+    X *= K
+    return np.fft.ifft(X,axis=0)
+
+
+def _worker(conn,p,spec):
+    """
+    Loop of a SlabPM worker process: runs the phases asked by the parent on its slab
+    and answers with None (or the error) when done
+    """
+    shms = {k:shared_memory.SharedMemory(name=name) for k,(name,shape,dtype) in spec['arrays'].items()}
+    A = {k:np.ndarray(shape,dtype=dtype,buffer=shms[k].buf) for k,(name,shape,dtype) in spec['arrays'].items()}
+    size, fft_shape = spec['size'], spec['fft_shape']
+    scheme, periodic = spec['scheme'], spec['periodic']
+    lo, hi = spec['rows'][p], spec['rows'][p+1]
+    clo, chi = spec['cols'][p], spec['cols'][p+1]
+    own = min(hi,size[0])
+    ghosts = _ghost_rows(lo,hi,size[0],periodic)
+    K = None
+    while True:
+        cmd = conn.recv()
+        if cmd == 'stop':
+            break
+        try:
+            if cmd == 'kernel':
+                K = _kernel_block(A['ffG'],fft_shape,clo,chi)
+            elif cmd == 'deposit':
+                L = _deposit_rows(A['pos'],A['mass'],size,scheme,periodic,lo,hi)
+                if own > lo:
+                    A['rho'][lo:own] = L[GHOST:GHOST+own-lo]
+                A['ghost'][p] = np.concatenate([L[:GHOST],L[hi-lo+GHOST:]])
+                A['ghost_rows'][p] = ghosts
+            elif cmd == 'ghosts':
+                #Every slab's ghost rows that land in this one
+                for q in range(len(A['ghost'])):
+                    for j,r in enumerate(A['ghost_rows'][q]):
+                        if lo <= r < own:
+                            A['rho'][r] += A['ghost'][q,j]
+            elif cmd == 'forward':
+                rows = np.zeros((hi-lo,)+tuple(size[1:]))
+                rows[:max(own-lo,0)] = A['rho'][lo:own]
+                A['spectrum'][lo:hi] = _forward(rows,fft_shape)
+            elif cmd == 'convolve':
+                #The transpose: this worker now reads a block of columns of every slab
+                X = _convolve(A['spectrum'][:,clo:chi],K)
+                A['spectrum'][:,clo:chi] = X
+            elif cmd == 'backward':
+                A['V'][lo:hi] = _backward(A['spectrum'][lo:hi],fft_shape)
+            conn.send(None)
+        except Exception as e:
+            conn.send(e)
+    A = None
+    for shm in shms.values():
+        shm.close()
+
+
+def _shutdown(procs,conns,shms):
+    for conn in conns:
+        try:
+            conn.send('stop')
+        except (BrokenPipeError,OSError):
+            pass
+    for proc in procs:
+        proc.join()
+    for shm in shms:
+        shm.close()
+        shm.unlink()
+
+
+class SlabPM:
+    def __init__(self,size,fft_shape,workers,scheme='NGP',periodic=True,npart=0):
+        """
+        Slab-decomposed deposition and convolution of NBody.pot() over worker processes
+        sharing the grids through shared memory. The workers are stopped when this
+        object is garbage collected (or with close()).
+        Input(s):
+            - size (tuple): shape of the grid of the particles
+            - fft_shape (tuple): shape of the grid of the FFTs (padded if Non-Periodic)
+            - workers (int): number of slabs/worker processes
+            - scheme (str): mass assignment scheme (see deposition.py)
+            - periodic (bool): boundary type
+            - npart (int): number of particles
+        """
+        size, fft_shape = tuple(size), tuple(fft_shape)
+        if len(size) < 2:
+            raise ValueError('The slab decomposition needs at least 2 dimensions')
+        cshape = fft_shape[:-1]+(fft_shape[-1]//2+1,)
+        if workers > min(fft_shape[0],cshape[1]):
+            raise ValueError(f'Too many slabs ({workers}) for a grid of {fft_shape}')
+        self.size = size
+        self.fft_shape = fft_shape
+        self.workers = workers
+        self.npart = npart
+        shapes = {'pos':((npart,len(size)),'f8'),'mass':((npart,),'f8'),'rho':(size,'f8'),
+                  'ghost':((workers,2*GHOST)+size[1:],'f8'),'ghost_rows':((workers,2*GHOST),'i8'),
+                  'ffG':(cshape,'c16'),'spectrum':(cshape,'c16'),'V':(fft_shape,'f8')}
+        self.shms = []
+        self.arrays = {}
+        spec = {'arrays':{},'size':size,'fft_shape':fft_shape,'scheme':scheme,'periodic':periodic,
+                'rows':bounds(fft_shape[0],workers),'cols':bounds(cshape[1],workers)}
+        for k,(shape,dtype) in shapes.items():
+            nbytes = max(int(np.prod(shape))*np.dtype(dtype).itemsize,1)
+            shm = shared_memory.SharedMemory(create=True,size=nbytes)
+            self.shms.append(shm)
+            self.arrays[k] = np.ndarray(shape,dtype=dtype,buffer=shm.buf)
+            spec['arrays'][k] = (shm.name,shape,dtype)
+
+        self.conns = []
+        self.procs = []
+        for p in range(workers):
+            parent,child = mp.Pipe()
+            proc = mp.Process(target=_worker,args=(child,p,spec),daemon=True)
+            proc.start()
+            self.conns.append(parent)
+            self.procs.append(proc)
+        self._finalizer = weakref.finalize(self,_shutdown,self.procs,self.conns,self.shms)
+
+    def _run(self,cmd):
+        """
+        Runs a phase on every worker and waits for all of them (the barrier between phases)
+        """
+        for conn in self.conns:
+            conn.send(cmd)
+        errors = [conn.recv() for conn in self.conns]
+        for e in errors:
+            if e is not None:
+                raise RuntimeError(f'A slab worker failed during {cmd}') from e
+
+    def set_kernel(self,ffG):
+        """
+        Gives the spectrum of the green function (NBody.kernel_spectrum()) to the workers
+        """
+        self.arrays['ffG'][...] = ffG
+        self._run('kernel')
+
+    def deposit(self,posP,mass):
+        """
+        Deposits the particles, each worker handling those in its slab.
+        Output(s):
+            - rho (array): masses on the grid. Overwritten by the next call
+        """
+        self.arrays['pos'][...] = posP
+        self.arrays['mass'][...] = np.reshape(mass,-1)
+        self._run('deposit')
+        self._run('ghosts')
+        return self.arrays['rho']
+
+    def potential(self):
+        """
+        Potential of the last densities deposited, shifted and averaged like in
+        NBody.pot(), on the whole fft_shape grid. Overwritten by the next call
+        """
+        for cmd in ('forward','convolve','backward'):
+            self._run(cmd)
+        return self.arrays['V']
+
+    def close(self):
+        """
+        Stops the workers and frees the shared memory (the arrays returned by deposit()
+        and potential() become invalid)
+        """
+        self.arrays = {}
+        self._finalizer()
+
+
+class MPISlabPM:
+    def __init__(self,size,fft_shape,scheme='NGP',periodic=True,comm=None):
+        """
+        Same decomposition as SlabPM with one slab per MPI rank. The ghost rows go
+        through an allgather and the transposes through alltoall.
+        Input(s):
+            - size, fft_shape, scheme, periodic: see SlabPM
+            - comm (MPI communicator): MPI.COMM_WORLD if None
+        """
+        if MPI is None:
+            raise ImportError('mpi4py is needed for MPISlabPM')
+        self.comm = MPI.COMM_WORLD if comm is None else comm
+        self.size, self.fft_shape = tuple(size), tuple(fft_shape)
+        self.scheme, self.periodic = scheme, periodic
+        P, p = self.comm.Get_size(), self.comm.Get_rank()
+        cshape = self.fft_shape[:-1]+(self.fft_shape[-1]//2+1,)
+        self.rows = bounds(self.fft_shape[0],P)
+        self.cols = bounds(cshape[1],P)
+        self.lo, self.hi = self.rows[p], self.rows[p+1]
+        self.own = min(self.hi,self.size[0])
+        self.K = None
+
+    def set_kernel(self,ffG):
+        """
+        ffG (the whole spectrum) only needs to be given on rank 0
+        """
+        ffG = self.comm.bcast(ffG,root=0)
+        p = self.comm.Get_rank()
+        self.K = _kernel_block(ffG,self.fft_shape,self.cols[p],self.cols[p+1])
+
+    def deposit(self,posP,mass):
+        """
+        Sends the particles given on each rank to the rank owning them, then deposits.
+        Output(s):
+            - posP, mass (array): particles now owned by this rank
+            - rho (array): masses of the rows lo to min(hi,size[0]) of this rank
+        """
+        P = self.comm.Get_size()
+        owner = np.searchsorted(self.rows,_owner_rows(posP,self.size,self.periodic),side='right')-1
+        mass = np.reshape(mass,-1)
+        parts = self.comm.alltoall([(posP[owner == q],mass[owner == q]) for q in range(P)])
+        posP = np.concatenate([x for x,m in parts])
+        mass = np.concatenate([m for x,m in parts])
+
+        L = _deposit_rows(posP,mass,self.size,self.scheme,self.periodic,self.lo,self.hi)
+        rho = L[GHOST:GHOST+max(self.own-self.lo,0)].copy()
+        ghost = np.concatenate([L[:GHOST],L[self.hi-self.lo+GHOST:]])
+        ghosts = _ghost_rows(self.lo,self.hi,self.size[0],self.periodic)
+        for g,rows in self.comm.allgather((ghost,ghosts)):
+            for j,r in enumerate(rows):
+                if self.lo <= r < self.own:
+                    rho[r-self.lo] += g[j]
+        return posP,mass.reshape(-1,1),rho
+
+    def potential(self,rho):
+        """
+        Potential of the rows of this rank (shifted and averaged like in NBody.pot())
+        Input(s):
+            - rho (array): output of deposit()
+        Output(s):
+            - V (array): rows lo to hi of the potential on the fft_shape grid
+        """
+        P = self.comm.Get_size()
+        rows = np.zeros((self.hi-self.lo,)+self.size[1:])
+        rows[:len(rho)] = rho
+        S = _forward(rows,self.fft_shape)
+        #Transpose: every rank sends the columns of each other rank
+        blocks = self.comm.alltoall([S[:,self.cols[q]:self.cols[q+1]] for q in range(P)])
+        X = _convolve(np.concatenate(blocks,axis=0),self.K)
+        blocks = self.comm.alltoall([X[self.rows[q]:self.rows[q+1]] for q in range(P)])
+        return _backward(np.concatenate(blocks,axis=1),self.fft_shape)
+
+
+def _check(npart=20000,size=(96,64),scheme='CIC'):
+    """
+    Compares the slab solvers with the serial NBody.pot()
+    """
+    import particle as P
+    import NBody as nb
+    comm = MPI.COMM_WORLD if MPI is not None else None
+    parallel = comm is not None and comm.Get_size() > 1
+    for boundary_type in ['Periodic','Non-Periodic']:
+        s = P.system_init(npart,size,1.0,npart_specificVel=0,boundary_type=boundary_type,seed=1)
+        g = nb.NBody(size,s,1,soft=0.8,boundary_type=boundary_type,scheme=scheme)
+        V = g.pot()
+        if parallel:
+            solver = MPISlabPM(size,g.fft_shape,scheme,g.periodic,comm)
+            solver.set_kernel(g.ffG)
+            #Every rank starts with a share of the particles, wherever they are
+            mine = slice(comm.Get_rank(),None,comm.Get_size())
+            pos,mass,rho = solver.deposit(g.posP[mine],g.mass[mine])
+            rows = comm.gather(solver.potential(rho),root=0)
+            if comm.Get_rank() != 0:
+                continue
+            Vs = np.concatenate(rows)
+            label = f'{comm.Get_size()} MPI ranks'
+        else:
+            solver = SlabPM(size,g.fft_shape,4,scheme,g.periodic,npart)
+            solver.set_kernel(g.ffG)
+            solver.deposit(g.posP,g.mass)
+            Vs = solver.potential().copy()
+            solver.close()
+            label = '4 processes'
+        Vs = Vs[tuple(slice(0,n) for n in size)]
+        print(f'{boundary_type} {scheme}, {label}: max |V_slab-V|/max|V| = {np.max(np.abs(Vs-V))/np.max(np.abs(V)):.2e}')
+
+
+if __name__ == '__main__':
+    _check()
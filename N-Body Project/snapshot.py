@@ -0,0 +1,161 @@
+import json
+import os
+import numpy as np
+
+from background import BackgroundWorker
+
+
+class SnapshotWriter:
+    def __init__(self,path,track=None,velocities=True,asynchronous=True,maxqueue=8):
+        """
+        Saves the state of a run in a folder holding one raw binary file per quantity
+        (pos.bin, vel.bin, energy.bin, step.bin, ...) plus a meta.json describing their
+        dtype and shape. Each snapshot is appended at the end of those files, so saving
+        never re-reads or re-writes anything, and load() maps them back without parsing.
+        Writing to a folder that already has snapshots appends to them.
+        Input(s):
+            - path (str): folder of the snapshots (created if needed)
+            - track (int): number of particles saved (all of them if None)
+            - velocities (bool): also save the velocities of those particles
+            - asynchronous (bool): write in a background thread, so the I/O overlaps
+            the next steps of the simulation
+            - maxqueue (int): maximum number of snapshots waiting to be written
+        """
+        os.makedirs(path,exist_ok=True)
+        self.path = path
+        self.track = track
+        self.velocities = velocities
+        self.files = {}
+        self.meta = None
+        if os.path.exists(self._meta_file()):
+            with open(self._meta_file()) as f:
+                self.meta = json.load(f)
+        self.worker = BackgroundWorker(maxqueue) if asynchronous else None
+
+    def _meta_file(self):
+        return os.path.join(self.path,'meta.json')
+
+    def write(self,step,posP,velocityP=None,energy=None,time=None,**extra):
+        """
+        Adds a snapshot. The arrays are copied right away, so the simulation can keep
+        going while they are written.
+        Input(s):
+            - step (int): step counter of the run
+            - posP, velocityP (array): positions and velocities of the particles (None 
+            to only save the other quantities, e.g. diagnostics)
+            - energy (float): total energy of the system
+            - time (float): time of the simulation
+            - extra (array): any other quantity to save along (e.g. a power spectrum)
+        """
+        record = {'step':np.int64(step)}
+        if posP is not None:
+            record['pos'] = posP[:self.track]
+        if self.velocities and velocityP is not None:
+            record['vel'] = velocityP[:self.track]
+        if energy is not None:
+            record['energy'] = np.float64(energy)
+        if time is not None:
+            record['time'] = np.float64(time)
+        record.update(extra)
+        record = {k:np.array(v) for k,v in record.items()}
+
+        if self.worker is None:
+            self._append(record)
+        else:
+            self.worker.submit(self._append,record)
+
+    def _append(self,record):
+        if self.meta is None:
+            self.meta = {'fields':{}}
+        #Every field is checked before any is written, so they keep the same number of records
+        for k,v in record.items():
+            info = self.meta['fields'].get(k)
+            if info is not None and list(v.shape) != info['shape']:
+                raise ValueError(f"{k} has shape {v.shape} but the snapshots hold {tuple(info['shape'])}")
+        new = [k for k in record if k not in self.meta['fields']]
+        for k in new:
+            self.meta['fields'][k] = {'dtype':record[k].dtype.str,'shape':list(record[k].shape)}
+        if new:
+            with open(self._meta_file(),'w') as f:
+                json.dump(self.meta,f,indent=1)
+
+        for k,v in record.items():
+            info = self.meta['fields'][k]
+            if k not in self.files:
+                self.files[k] = open(os.path.join(self.path,f'{k}.bin'),'ab')
+            self.files[k].write(np.ascontiguousarray(v,dtype=info['dtype']).tobytes())
+        for f in self.files.values():
+            f.flush()
+
+    def flush(self):
+        """
+        Waits until every snapshot given so far is on disk
+        """
+        if self.worker is not None:
+            self.worker.wait()
+
+    def close(self):
+        if self.worker is not None:
+            self.worker.close()
+        for f in self.files.values():
+            f.close()
+        self.files = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*args):
+        self.close()
+
+
+def load(path,fields=None):
+    """
+    Loads the snapshots written by SnapshotWriter as memory-mapped arrays, so only
+    the parts that are actually used get read from the disk. A snapshot that was only
+    partially written (e.g. the run died) is ignored.
+    Input(s):
+        - path (str): folder of the snapshots
+        - fields (list): quantities to load (all of them if None)
+    Output(s):
+        - snaps (dict): one array per quantity, with the snapshots along the first axis,
+        e.g. snaps['pos'][i] are the positions of the i-th snapshot
+    """
+    with open(os.path.join(path,'meta.json')) as f:
+        meta = json.load(f)
+    snaps = {}
+    for k,info in meta['fields'].items():
+        if fields is not None and k not in fields:
+            continue
+        dtype = np.dtype(info['dtype'])
+        shape = tuple(info['shape'])
+        file = os.path.join(path,f'{k}.bin')
+        count = os.path.getsize(file)//(dtype.itemsize*int(np.prod(shape)))
+        if count == 0:
+            snaps[k] = np.empty((0,)+shape,dtype=dtype)
+        else:
+            snaps[k] = np.memmap(file,dtype=dtype,mode='r',shape=(count,)+shape)
+    return snaps
+
+
+def truncate(path,step):
+    """
+    Drops the snapshots taken after a given step, along with a partially written one,
+    e.g. before a run restarts from an earlier checkpoint
+    Input(s):
+        - path (str): folder of the snapshots
+        - step (int): step counter of the last snapshot to keep
+    """
+    if not os.path.exists(os.path.join(path,'meta.json')):
+        return
+    steps = load(path,fields=['step']).get('step')
+    if steps is None:
+        return
+    keep = int(np.searchsorted(steps,step,side='right'))
+    del steps
+    with open(os.path.join(path,'meta.json')) as f:
+        meta = json.load(f)
+    for k,info in meta['fields'].items():
+        file = os.path.join(path,f'{k}.bin')
+        nbytes = keep*np.dtype(info['dtype']).itemsize*int(np.prod(info['shape']))
+        if os.path.exists(file) and os.path.getsize(file) > nbytes:
+            os.truncate(file,nbytes)
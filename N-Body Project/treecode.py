@@ -0,0 +1,160 @@
+import numpy as np
+
+
+class Tree:
+    def __init__(self,posP,mass,leaf_size=8,max_depth=32):
+        """
+        Barnes-Hut tree (quadtree in 2-D, octree in 3-D, 2**ndim children per node in
+        general) stored as flat arrays instead of node objects. It is built one level at
+        a time: all the nodes holding more than leaf_size particles are split at once
+        with numpy, so there is no python loop over particles or nodes.
+        Input(s):
+            - posP (array): (npart, ndim) positions of the particles
+            - mass (array): (npart, 1) masses of the particles
+            - leaf_size (int): most particles a node holds without being split
+            - max_depth (int): deepest level (stops splitting coincident particles)
+        """
+        npart,ndim = posP.shape
+        nchild = 2**ndim
+        self.posP = posP
+        self.mass = mass[:,0]
+        self.ndim = ndim
+
+        lo, hi = posP.min(axis=0), posP.max(axis=0)
+        centre = (lo+hi)[None]/2
+        half = np.array([max(np.max(hi-lo)/2,1e-12)*(1+1e-9)])
+        children = np.full((1,nchild),-1)
+        #Sign of the offset of each child along each axis, child c is on the upper
+        #side of axis a if bit a of c is set
+        signs = ((np.arange(nchild)[:,None] >> np.arange(ndim)) & 1)*2-1
+
+        node_of = np.zeros(npart,dtype=int)
+        members = [(node_of.copy(),np.arange(npart))]
+        active = np.arange(npart)
+        for depth in range(max_depth):
+            counts = np.bincount(node_of[active],minlength=len(half))
+            active = active[counts[node_of[active]] > leaf_size]
+            if len(active) == 0:
+                break
+            parent = node_of[active]
+            octant = np.sum((posP[active] > centre[parent]) << np.arange(ndim),axis=1)
+            keys,inv = np.unique(parent*nchild+octant,return_inverse=True)
+            ids = len(half)+np.arange(len(keys))
+            p, o = keys//nchild, keys % nchild
+            children = np.concatenate([children,np.full((len(keys),nchild),-1)])
+            children[p,o] = ids
+            centre = np.concatenate([centre,centre[p]+0.5*half[p,None]*signs[o]])
+            half = np.concatenate([half,0.5*half[p]])
+            node_of[active] = ids[inv]
+            members.append((ids[inv],active))
+
+        nnodes = len(half)
+        self.centre = centre
+        self.half = half
+        self.children = children
+        self.nnodes = nnodes
+
+        #Mass and centre of mass of every node, from all the particles below it
+        nodes = np.concatenate([m[0] for m in members])
+        parts = np.concatenate([m[1] for m in members])
+        self.node_mass = np.bincount(nodes,self.mass[parts],minlength=nnodes)
+        com = np.empty((nnodes,ndim))
+        for a in range(ndim):
+            com[:,a] = np.bincount(nodes,self.mass[parts]*posP[parts,a],minlength=nnodes)
+        with np.errstate(divide='ignore',invalid='ignore'):
+            self.com = np.where(self.node_mass[:,None] > 0,com/self.node_mass[:,None],self.centre)
+
+        #The particles of each leaf are contiguous in self.order
+        self.leaf = np.all(self.children < 0,axis=1)
+        self.order = np.argsort(node_of,kind='stable')
+        self.leaf_start = np.searchsorted(node_of[self.order],np.arange(nnodes))
+        self.leaf_count = np.bincount(node_of,minlength=nnodes)
+
+
+def _interaction(d,r2,soft):
+    """
+    Force per unit of both masses (along d) and potential of the softened green function
+    of NBody.green(), phi = 1/(4 pi R) with R = sqrt(max(r**2,soft**2)+soft**2)
+    """
+    R2 = np.maximum(r2,soft**2)+soft**2
+    R = np.sqrt(R2)
+    f = np.where(r2 > soft**2,1/(4*np.pi*R2*R),0.)
+    return f[:,None]*d,1/(4*np.pi*R)
+
+
+def forces(posP,mass,soft,G=1,theta=0.5,leaf_size=8,chunk=4096,energy=False,tree=None):
+    """
+    Gravitational forces with the Barnes-Hut approximation: a node is replaced by its
+    total mass at its centre of mass when its width is less than theta times its
+    distance to the particle (and the particle is outside of it). The walk is done
+    for chunk particles at once: each pass handles every (particle, node) pair still
+    open, then replaces the opened nodes by their children (or by their particles for
+    the leaves). Isolated boundaries only.
+    Input(s):
+        - posP (array): (npart, ndim) positions of the particles
+        - mass (array): (npart, 1) masses of the particles
+        - soft (float): softener of the green function
+        - G (float): gravitational constant
+        - theta (float): opening angle, 0 gives the direct summation
+        - leaf_size (int): most particles in a leaf of the tree
+        - chunk (int): number of particles walking the tree together (bounds the memory)
+        - energy (bool): also return the potential energy
+        - tree (Tree): tree of the particles, built here if None
+    Output(s):
+        - F (array): (npart, ndim) forces on the particles
+        - U (float): potential energy (only if energy is True)
+    """
+    if tree is None:
+        tree = Tree(posP,mass,leaf_size=leaf_size)
+    npart,ndim = posP.shape
+    F = np.zeros((npart,ndim))
+    phi = np.zeros(npart)
+    for lo in range(0,npart,chunk):
+        hi = min(npart,lo+chunk)
+        p = np.arange(lo,hi)
+        n = np.zeros(len(p),dtype=int)
+        #Accumulated per chunk so the bincounts stay the size of the chunk
+        Fc = np.zeros((hi-lo,ndim))
+        phic = np.zeros(hi-lo)
+        while len(p):
+            d = tree.com[n]-posP[p]
+            r2 = np.sum(d**2,axis=1)
+            outside = np.any(np.abs(posP[p]-tree.centre[n]) > tree.half[n,None],axis=1)
+            accept = outside & ((2*tree.half[n])**2 < theta**2*r2)
+            leaf = ~accept & tree.leaf[n]
+            opened = ~accept & ~leaf
+
+            #Far nodes: monopole of the node
+            fa,pa = _interaction(d[accept],r2[accept],soft)
+            M = tree.node_mass[n[accept]]
+            for a in range(ndim):
+                Fc[:,a] += np.bincount(p[accept]-lo,M*fa[:,a],minlength=hi-lo)
+            phic += np.bincount(p[accept]-lo,M*pa,minlength=hi-lo)
+
+            #Leaves that are too close: every particle of the leaf
+            pl,nl = p[leaf],n[leaf]
+            counts = tree.leaf_count[nl]
+            pp = np.repeat(pl,counts)
+            first = np.repeat(tree.leaf_start[nl],counts)
+            within = np.arange(len(pp))-np.repeat(np.cumsum(counts)-counts,counts)
+            q = tree.order[first+within]
+            keep = pp != q
+            pp,q = pp[keep],q[keep]
+            d = posP[q]-posP[pp]
+            fq,pq = _interaction(d,np.sum(d**2,axis=1),soft)
+            for a in range(ndim):
+                Fc[:,a] += np.bincount(pp-lo,tree.mass[q]*fq[:,a],minlength=hi-lo)
+            phic += np.bincount(pp-lo,tree.mass[q]*pq,minlength=hi-lo)
+
+            #Nodes that are too close: walk down to their children
+            ch = tree.children[n[opened]]
+            valid = ch >= 0
+            p = np.repeat(p[opened],np.sum(valid,axis=1))
+            n = ch[valid]
+        F[lo:hi] = Fc
+        phi[lo:hi] = phic
+
+    F *= G*mass
+    if energy:
+        return F,-0.5*G*np.sum(mass[:,0]*phi)
+    return F
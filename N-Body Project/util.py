@@ -1,20 +1,31 @@
+import os
 import numpy as np
 
+import snapshot
 
-def evolve(posP,velocityP,mass,f,dt,size):
+
+def evolve(posP,velocityP,mass,f,dt,size,dt_kick=None):
     """
     Evolves the particle's position and momentum using the leap frog method seen in class
     Inputs: 
         - f_current (array): The forces on the particle 
         - f_new (array): changed forces on the particle 
         - dt (float): time step in seconds 
+        - size (int or tuple): size of the grid, one entry per axis for rectangular grids.
+        None for isolated (Non-Periodic) boxes, where the positions are not wrapped
+        - dt_kick (float): time step of the velocity update if it differs from dt (e.g. the
+        half kicks of integrators.kdk)
     """
+    if dt_kick is None:
+        dt_kick = dt
     #print (velocity.shape,f.shape,mass.shape,"icitte")
-    velocityP = velocityP+f*dt/mass
+    velocityP = velocityP+f*dt_kick/mass
 
     # update position
     posP = posP+velocityP*dt
-    posP = posP%size
+    if size is not None:
+        #Same float type as the positions, or float32 ones would be promoted to float64
+        posP = posP%np.asarray(size,dtype=posP.dtype)
     return posP,velocityP 
 
 def loadPosition(file):
@@ -22,17 +33,22 @@ def loadPosition(file):
     Function that loads in the position and converts them to an actual numpy 
     array 
     Input(s):
-        - file (file): file containing the positions of the particle
+        - file (str or file): folder of snapshots written by snapshot.SnapshotWriter, 
+        or a text file of positions written with file_save_pos (300 frames of 40 particles)
     Output(s):
-        - A (array): positions of the particles in a numpy array format
+        - A (array): positions of the particles in a numpy array format, (frame, particle, axis).
+        Memory-mapped for a snapshot folder
     """
+    if isinstance(file,str) and os.path.isdir(file):
+        return snapshot.load(file,fields=['pos'])['pos']
+
     A = []
     for i in range(300):
         H = []
         for x in range(40):
             string = file.readline().replace('[[','').replace(']]','').replace('\n','').replace('[','').replace(']','')
             num = np.array(string.split())
-            num = num.astype(np.float)
+            num = num.astype(float)
             H.append(num)
         A.append(H)
     return A
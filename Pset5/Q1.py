@@ -120,7 +120,7 @@ def density(V,mask):
     return get_laplacian(V,mask,copy=True)[1:-1,1:-1]
 
 
-def relaxation(V,bc,mask,maxIter=10000,thresh=1e-2):
+def relaxation(V,bc,mask,maxIter=10000,thresh=1e-2,check=1):
     """
     Implements the relaxation method as seen in class.
     Inputs:
@@ -128,28 +128,31 @@ def relaxation(V,bc,mask,maxIter=10000,thresh=1e-2):
         - bc (array): boundary condition array
         - maxIter (int): maximum iterations of the relexation method
         - thresh (float): accuracy to which we want to solve in
+        - check (int): number of iterations between two checks of the residual,
+        which costs about as much as an iteration
+    Outputs:
+        - count (int): number of iterations
     """
     st = time.time()
-    r=get_rhs(bc,mask)-get_laplacian(V,mask,copy=True)
-    rtr = np.sum(r*r)
+    rhs = get_rhs(bc,mask) #does not change between iterations
+    fixed = bc[mask]
     for i in range(maxIter):
         V[1:-1,1:-1] = (V[1:-1,:-2]+V[1:-1,2:]+V[2:,1:-1]+V[:-2,1:-1])/4.0
-        V[mask] = bc[mask]
-        r = get_rhs(bc,mask) - get_laplacian(V,mask,copy=True)
-        rtr=np.sum(r*r)
-        if rtr>thresh:
+        V[mask] = fixed
+        if (i+1) % check and i < maxIter-1:
             continue
-        elif rtr < thresh: 
+        r = rhs - get_laplacian(V,mask,copy=True)
+        rtr=np.sum(r*r)
+        if rtr < thresh: 
             fi = time.time()-st
             print (f"The relaxation method converged after {i} iterations."
                   f"This algorithm converged in {fi}s")
-            break
-        elif i ==maxIter-1:
-            fi = time.time()-st
-            print (f"The relaxation did not converge before reaching the maximum"
-                  f"iteration. Either increase the steps or change the intial bc's."
-                  f"This took about {fi}s to finish. Potential may be solved poorly")
-            break
+            return i
+    fi = time.time()-st
+    print (f"The relaxation did not converge before reaching the maximum"
+          f"iteration. Either increase the steps or change the intial bc's."
+          f"This took about {fi}s to finish. Potential may be solved poorly")
+    return maxIter
 
 def plot_three_results(V,V_true,d,sp,x,y,figsize=(20,6)):
     """
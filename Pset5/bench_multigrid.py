@@ -0,0 +1,67 @@
+import contextlib
+import io
+import sys
+import time
+import numpy as np
+import Q1
+import Q2
+import Q3
+import multigrid
+
+"""
+Iterations and wall time of the solvers of the cylinder problem: Q1.relaxation(),
+Q2.cg(), Q3.res_cg() and the V-cycles, W-cycles and full multigrid of multigrid.py,
+all stopped at the same sum of the squared residuals. The error is measured against
+a solution converged much further. An iteration is a sweep for the relaxation, a step
+for the conjugate gradients (summed over the grids for res_cg) and a cycle for
+multigrid. The relaxation is only run on grids up to 256 as it needs many
+thousands of sweeps beyond.
+Run from this folder with: python bench_multigrid.py [n ...]
+"""
+
+def counted_res_cg(bc,mask,**kwargs):
+    #res_cg only prints its iterations, count the ones of the Q2.cg calls it makes
+    cg = Q2.cg
+    count = 0
+    def wrapper(*args,**kw):
+        nonlocal count
+        V, k = cg(*args,**kw)
+        count += k
+        return V, k
+    Q2.cg = wrapper
+    try:
+        V = Q3.res_cg(bc,mask,**kwargs)
+    finally:
+        Q2.cg = cg
+    return V, count
+
+def solvers(n):
+    out = {}
+    if n <= 256:
+        out['relaxation'] = lambda V,bc,mask,t: (V, Q1.relaxation(V,bc,mask,maxIter=100000,thresh=t,check=10))
+    out['cg'] = lambda V,bc,mask,t: Q2.cg(bc,mask,V0=V,thresh=t)
+    #Coarsest grid of res_cg no smaller than 16
+    npass = min(6,int(np.log2(n))-3)
+    if n % 2**(npass-1) == 0:
+        out['res_cg'] = lambda V,bc,mask,t: counted_res_cg(bc,mask,npass=npass,thresh=t)
+    for kind in ['V','W','FMG']:
+        out[f'multigrid {kind}'] = lambda V,bc,mask,t,kind=kind: multigrid.multigrid(bc,mask,V0=V,kind=kind,thresh=t)
+    return out
+
+if __name__ == '__main__':
+    sizes = [int(n) for n in sys.argv[1:]] or [128,256,512,1024]
+    thresh = 1e-2
+    print(f"Cylinder of radius n/5 at potential 1, stopped at sum(r**2) < {thresh}")
+    print(f"{'n':>6} {'solver':>12} {'iterations':>11} {'time [s]':>9} {'max |V-V*|':>11}")
+    for n in sizes:
+        V,bc,mask,x,y = Q1.cylinder(n,n//5,1)
+        with contextlib.redirect_stdout(io.StringIO()):
+            ref, count = multigrid.multigrid(bc,mask,thresh=1e-20)
+        for name, solve in solvers(n).items():
+            V,bc,mask,x,y = Q1.cylinder(n,n//5,1)
+            st = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                V, count = solve(V,bc,mask,thresh)
+            fi = time.perf_counter()-st
+            diff = np.abs(V-ref).max()
+            print(f"{n:>6} {name:>12} {count:>11} {fi:>9.3f} {diff:>11.2e}", flush=True)
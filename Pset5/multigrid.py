@@ -0,0 +1,206 @@
+import time
+import numpy as np
+from scipy.linalg import cho_factor, cho_solve
+import Q1
+import Q3
+
+"""
+Geometric multigrid for the same problem as Q1, Q2 and Q3: A V = b where A is the
+Laplacian of Q1.get_laplacian() (4V minus the neighbours, the masked points being
+dropped) and b = Q1.get_rhs(bc,mask). Only the points outside the mask are unknowns.
+The coarse grids are made by halving the resolution with Q3.lower_res(), so a coarse
+cell is masked as soon as one of its four fine cells is. This means n must be a
+power of 2 times the size of the coarsest grid (at most 8 by default, e.g. n = 96 or
+1024 but not 150), like for Q3.res_cg(). hierarchy() raises a ValueError otherwise.
+"""
+
+def restrict(r):
+    """
+    Sums each 2x2 block of a fine residual. The coarse Laplacian has cells twice as
+    wide, so it is 4 times the fine one for the same field and the sum (4 times
+    the mean) is the right hand side it needs.
+    Inputs:
+        - r (array): residual on the fine grid
+    Outputs:
+        - r_c (array): residual on the grid of half the resolution
+    """
+    n, m = r.shape
+    return r.reshape(n//2,2,m//2,2).sum(axis=(1,3))
+
+def _prolong_axis(e,axis):
+    e = np.moveaxis(e,axis,0)
+    pad = np.zeros((e.shape[0]+2,)+e.shape[1:])
+    pad[1:-1] = e
+    out = np.empty((2*e.shape[0],)+e.shape[1:])
+    out[0::2] = 0.75*pad[1:-1]+0.25*pad[:-2]
+    out[1::2] = 0.75*pad[1:-1]+0.25*pad[2:]
+    return np.moveaxis(out,0,axis)
+
+def prolong(e):
+    """
+    Bilinear interpolation of a coarse correction to the grid of twice the
+    resolution (each fine cell takes 9/16 of its coarse cell, 3/16 of the two
+    closest neighbours and 1/16 of the diagonal one). Outside the grid is 0.
+    Inputs:
+        - e (array): correction on the coarse grid
+    Outputs:
+        - e_f (array): correction on the fine grid
+    """
+    return _prolong_axis(_prolong_axis(e,0),1)
+
+class Level:
+    def __init__(self,mask):
+        """
+        One grid of the hierarchy: its mask and the weights of the red-black
+        Gauss-Seidel sweeps, which only depend on the mask.
+        Inputs:
+            - mask (array): Array of bools where True is where the bc apply
+        """
+        self.mask = mask
+        i, j = np.indices(mask.shape)
+        red = (i+j) % 2 == 0
+        self.red = 0.25*(red & ~mask)
+        self.black = 0.25*(~red & ~mask)
+        self.direct = None
+
+    def residual(self,u,f):
+        return f-Q1.get_laplacian(u,self.mask)
+
+    def smooth(self,u,f,sweeps):
+        """
+        Red-black Gauss-Seidel: every point of a colour is set to (f + its neighbours)/4,
+        i.e. moved by a quarter of its residual, which only involves the other colour.
+        """
+        for k in range(sweeps):
+            u += self.red*self.residual(u,f)
+            u += self.black*self.residual(u,f)
+        return u
+
+    def solve(self,f):
+        """
+        Exact solution on the coarsest grid. The matrix of the Laplacian over the
+        unknowns is built and Cholesky factorized once, column by column with
+        get_laplacian(), which is why that grid has to stay small (see hierarchy()).
+        """
+        free = np.flatnonzero(~self.mask)
+        if free.size == 0:
+            return np.zeros(self.mask.shape)
+        if self.direct is None:
+            A = np.empty((free.size,free.size))
+            e = np.zeros(self.mask.shape)
+            for c, p in enumerate(free):
+                e.flat[p] = 1
+                A[:,c] = Q1.get_laplacian(e,self.mask).flat[free]
+                e.flat[p] = 0
+            self.direct = cho_factor(A)
+        u = np.zeros(self.mask.shape)
+        u.flat[free] = cho_solve(self.direct,f.flat[free])
+        return u
+
+def hierarchy(mask,coarsest=8):
+    """
+    Masks of all the grids, halving the resolution with Q3.lower_res() until the
+    grid is no larger than coarsest.
+    Inputs:
+        - mask (array): mask of the finest grid (square)
+        - coarsest (int): largest size of the coarsest grid
+    Outputs:
+        - levels (list): Level of each grid, the finest first
+    """
+    n = mask.shape[0]
+    if mask.shape != (n,n):
+        raise ValueError(f"The grid must be square, not {mask.shape}")
+    levels = [Level(mask)]
+    while mask.shape[0] > coarsest:
+        if mask.shape[0] % 2:
+            raise ValueError(f"The size {n} cannot be halved down to at most {coarsest}"
+                             f" (stops at {mask.shape[0]}), use a power of 2 times a size"
+                             f" no larger than {coarsest}")
+        mask = Q3.lower_res(mask)
+        levels.append(Level(mask))
+    return levels
+
+def cycle(levels,u,f,l=0,gamma=1,pre=2,post=2):
+    """
+    One multigrid cycle on level l: pre smoothing, correction from the next coarser
+    grid (solved by gamma cycles, 1 for a V-cycle and 2 for a W-cycle) and post
+    smoothing.
+    Inputs:
+        - levels (list): output of hierarchy()
+        - u (array): current solution on level l, 0 on the mask (updated in place)
+        - f (array): right hand side on level l
+        - gamma (int): cycles on each coarser grid
+        - pre, post (int): sweeps of red-black Gauss-Seidel before and after
+    Outputs:
+        - u (array): improved solution
+    """
+    level = levels[l]
+    if l == len(levels)-1:
+        u[...] = level.solve(f)
+        return u
+    level.smooth(u,f,pre)
+    f_c = restrict(level.residual(u,f))
+    coarse = levels[l+1]
+    f_c[coarse.mask] = 0
+    e = np.zeros(f_c.shape)
+    for k in range(gamma):
+        cycle(levels,e,f_c,l+1,gamma,pre,post)
+    e = prolong(e)
+    e[level.mask] = 0
+    u += e
+    return level.smooth(u,f,post)
+
+def multigrid(bc,mask,V0=None,kind='V',maxIter=100,thresh=1e-2,check=1,pre=2,post=2,coarsest=8):
+    """
+    Solves for the potential with multigrid cycles until the residual is below thresh,
+    the same criterion as Q1.relaxation() and Q2.cg(). The right hand side is computed
+    once, and the residual of the whole grid is only checked every few cycles.
+    Inputs:
+        - bc (array): boundary condition array
+        - mask (array): Array of bools where True is where the bc apply
+        - V0 (array): initial guess (bc if None)
+        - kind (str): 'V' or 'W' cycles, or 'FMG' to start from the solution of the
+        coarser grids (full multigrid) before doing V-cycles
+        - maxIter (int): maximum number of cycles
+        - thresh (float): accuracy to which we want to solve in (sum of the squared residuals)
+        - check (int): number of cycles between two checks of the residual
+        - pre, post (int): sweeps of red-black Gauss-Seidel before and after each correction
+        - coarsest (int): largest size of the coarsest grid
+    Outputs:
+        - V (array): solved potential
+        - count (int): number of cycles
+    """
+    st = time.time()
+    levels = hierarchy(mask,coarsest)
+    gamma = 2 if kind == 'W' else 1
+    f = Q1.get_rhs(bc,mask)
+    if kind == 'FMG':
+        #Same problem on every grid, the bc being coarsened like in Q3.res_cg()
+        all_bc = [bc]
+        for level in levels[1:]:
+            all_bc.append(Q3.lower_res(all_bc[-1]))
+        u = levels[-1].solve(Q1.get_rhs(all_bc[-1],levels[-1].mask))
+        for l in range(len(levels)-2,-1,-1):
+            u = prolong(u)
+            u[levels[l].mask] = 0
+            f_l = f if l == 0 else Q1.get_rhs(all_bc[l],levels[l].mask)
+            cycle(levels,u,f_l,l,1,pre,post)
+    else:
+        u = bc.copy() if V0 is None else np.array(V0,dtype=float)
+        u[mask] = 0
+    count = 1 if kind == 'FMG' else 0
+    rtr = np.sum(levels[0].residual(u,f)**2)
+    while rtr >= thresh and count < maxIter:
+        for k in range(min(check,maxIter-count)):
+            cycle(levels,u,f,0,gamma,pre,post)
+            count += 1
+        rtr = np.sum(levels[0].residual(u,f)**2)
+    fi = time.time()-st
+    if rtr < thresh:
+        print(f"Multigrid ({kind}) converged in {fi}s after {count} cycles")
+    else:
+        print(f"Multigrid ({kind}) did not converge after {count} cycles, the potential"
+              f" might be solved poorly. This took {fi}s")
+    V = u
+    V[mask] = bc[mask]
+    return V, count